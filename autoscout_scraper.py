@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
-import os, re, json
+import os, re, json, gzip, time, random, asyncio, hashlib, sqlite3, threading
+from contextlib import contextmanager, nullcontext, suppress
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import date, datetime
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 import pandas as pd, requests
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 
@@ -13,10 +17,11 @@ def read_cfg(path):
         with open(path,"r",encoding="utf-8") as f:
             return yaml.safe_load(f)
     except:
-        return {"start_url":"https://www.autoscout24.es/profesionales/love-cars","delay_seconds":1.2,"max_pages":200,"output_dir":"./output"}
+        return {"start_url":"https://www.autoscout24.es/profesionales/love-cars","delay_seconds":1.2,"max_pages":200,"output_dir":"./output",
+                "detail_concurrency":4,"max_requests_per_second":2.0}
 
 def ensure_dir(p): os.makedirs(p, exist_ok=True); return p
-def clean(s): return re.sub(r"\s+"," ", (s or "").strip())
+def clean(s): return RE_WS.sub(" ", (s or "").strip())
 def to_int(x):
     if x is None: return None
     v = re.sub(r"[^\d]","", str(x))
@@ -41,71 +46,202 @@ def guess_category(title):
     ind = ["FURGON","FURGÓN","VITO","TRAFIC","VIVARO","JUMPY","EXPERT","PARTNER","BERLINGO","SPRINTER","CRAFTER","DUCATO","BOXER","MASTER","MOVANO","KANGOO","CADDY","PROACE","DOBLO","COMBO","NV200"]
     return "Industrial" if any(k in t for k in ind) else "Turismo"
 
+# ----------------------- Métricas de la ejecución -----------------------
+
+class RunMetrics:
+    """Tiempos por etapa, contadores y gauges de una ejecución (seguro entre hilos); on_event recibe el progreso en vivo."""
+    PROGRESS_EVERY = 0.5
+
+    def __init__(self, on_event=None):
+        self.started = datetime.now()
+        self.t0 = time.perf_counter()
+        self.stages, self.counters, self.gauges = {}, {}, {}
+        self.lock = threading.Lock()
+        self.on_event, self._emitted = on_event, 0.0
+
+    @contextmanager
+    def timer(self, stage):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - t)
+
+    def add_time(self, stage, seconds):
+        with self.lock:
+            st = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            st["seconds"] += seconds; st["calls"] += 1
+
+    def inc(self, counter, n=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+        if self.on_event:
+            self.progress(force=False)
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def progress(self, force=True):
+        now = time.monotonic()
+        if not force and now - self._emitted < self.PROGRESS_EVERY:
+            return
+        self._emitted = now
+        with self.lock:
+            counters, gauges = dict(self.counters), dict(self.gauges)
+        self.emit("progress", counters=counters, gauges=gauges)
+
+    def emit(self, event, **data):
+        """Evento para quien sigue la ejecución (on_event); un fallo del oyente no para el scraper."""
+        if not self.on_event:
+            return
+        try:
+            self.on_event({"event": event, **data})
+        except Exception:
+            pass
+
+    def merge(self, report):
+        """Suma etapas, contadores y gauges de otro informe (p. ej. el de un worker de concesionario)."""
+        for k, v in (report or {}).get("stages", {}).items():
+            with self.lock:
+                st = self.stages.setdefault(k, {"seconds": 0.0, "calls": 0})
+                st["seconds"] += v.get("seconds", 0); st["calls"] += v.get("calls", 0)
+        for k, v in (report or {}).get("gauges", {}).items():
+            with self.lock:
+                self.gauges[k] = round(self.gauges.get(k, 0) + v, 3)
+        for k, v in (report or {}).get("counters", {}).items():
+            self.inc(k, v)
+
+    def report(self, **extra):
+        with self.lock:
+            return {"started_at": self.started.isoformat(timespec="seconds"),
+                    "finished_at": datetime.now().isoformat(timespec="seconds"),
+                    "duration_s": round(time.perf_counter() - self.t0, 3),
+                    "stages": {k: {"seconds": round(v["seconds"], 3), "calls": v["calls"]}
+                               for k, v in self.stages.items()},
+                    "counters": dict(self.counters), "gauges": dict(self.gauges), **extra}
+
+    def write(self, outdir, today, **extra):
+        rep = self.report(**extra)
+        for name in (f"run_report_{today}.json", "last_run_report.json"):
+            path = os.path.join(ensure_dir(outdir), name)
+            with open(path + ".part", "w", encoding="utf-8") as f: json.dump(rep, f, ensure_ascii=False, indent=2)
+            os.replace(path + ".part", path)
+        return rep
+
+
+# ----------------------- Parsers (lxml + XPath precompilado) -----------------------
+
+RE_WS      = re.compile(r"\s+")
+RE_EURO    = re.compile(r'€\s*([\d\.\s,]+)')
+RE_KM      = re.compile(r'(\d{1,3}(?:[.\s]\d{3})+|\d+)\s*km', re.I)
+RE_YEAR4   = re.compile(r'(\d{4})')
+RE_YEAR    = re.compile(r'(20\d{2}|201\d)')
+RE_REG     = re.compile(r'(\d{2}/)?(20\d{2}|201\d)')
+RE_POWER   = re.compile(r'(\d+)\s*kW.*?\((\d+)\s*CV\)')
+
+def _xp(expr):
+    return etree.XPath(expr)
+
+def _first(xpaths):
+    """Primer XPath (en orden de prioridad) que devuelve algo -> su primer nodo."""
+    def find(el):
+        for xp in xpaths:
+            r = xp(el)
+            if r:
+                return r[0]
+        return None
+    return find
+
+# Texto visible: como get_text(" ", strip=True) de BeautifulSoup (sin <script>/<style>)
+_TEXT = _xp(".//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]")
+
+def node_text(el):
+    return " ".join(t.strip() for t in _TEXT(el) if t.strip())
+
+def html_doc(html):
+    """Documento lxml desde str/bytes (admite declaración de encoding en el str)."""
+    if not html or not html.strip():
+        html = "<html></html>"
+    elif isinstance(html, str) and html.lstrip()[:5].lower() == "<?xml":
+        html = html.encode("utf-8")
+    return lxml.html.document_fromstring(html)
+
+def html_fragment(html):
+    """Fragmento (outerHTML de una tarjeta) envuelto en un <div>."""
+    return lxml.html.fragment_fromstring(html, create_parent="div")
+
+CARD_XPATH = _xp("//article | //*[contains(@class,'ListItem_wrapper__')] | //*[@data-item-name='listing']")
+
+_card_link = _first([_xp(".//a[@data-item-name='detail-page-link']"),
+                     _xp(".//a[@data-testid='result-list-entry-link']"),
+                     _xp(".//a[contains(@href,'/anuncios/')]"),
+                     _xp(".//a[contains(@href,'/ofertas/')]")])
+_card_heading = _first([_xp(".//*[self::h2 or self::h3]")])
+_card_price = [_xp(".//*[@data-testid='price-label']"), _xp(".//*[@data-testid='srp-price']"),
+               _xp(".//*[@itemprop='price']"), _xp(".//*[contains(@class,'Price')]"),
+               _xp(".//*[contains(@class,'price')]")]
+_card_km = [_xp(".//*[@data-testid='mileage']"), _xp(".//*[contains(@class,'mileage')]"),
+            _xp(".//*[contains(@class,'Mileage')]")]
+_card_year = [_xp(".//*[@data-testid='first-registration']"), _xp(".//*[contains(@class,'first-registration')]"),
+              _xp(".//*[contains(@class,'FirstRegistration')]")]
+_card_img = _first([_xp(".//img")])
+
 def parse_card(card, base):
+    """Tarjeta del listado (elemento lxml) -> fila. Texto de la tarjeta calculado una sola vez."""
     # enlace + id
-    a = (card.select_one("a[data-item-name='detail-page-link']") or
-         card.select_one("a[data-testid='result-list-entry-link']") or
-         card.select_one("a[href*='/anuncios/']") or
-         card.select_one("a[href*='/ofertas/']"))
-    if not a:
+    a = _card_link(card)
+    if a is None:
         return None
     link = a.get("href", "")
     if link and not link.startswith("http"):
         link = base + link
-    lid = listing_id(link)
 
     # título y texto bruto
-    title = clean(a.get_text(" ", strip=True))
+    title = clean(node_text(a))
     if not title:
-        h = card.select_one("h2, h3")
-        if h:
-            title = clean(h.get_text(" ", strip=True))
-    raw = clean(card.get_text(" ", strip=True))
+        h = _card_heading(card)
+        if h is not None:
+            title = clean(node_text(h))
+    raw = clean(node_text(card))
 
     # ---- PRECIO ----
     price = None
-    for sel in ('[data-testid="price-label"]',
-                '[data-testid="srp-price"]',
-                '[itemprop="price"]',
-                '[class*="Price"]',
-                '[class*="price"]'):
-        el = card.select_one(sel)
-        if el:
-            txt = el.get("content") or el.get_text(" ", strip=True)
-            price = to_price(txt)
+    for xp in _card_price:
+        els = xp(card)
+        if els:
+            price = to_price(els[0].get("content") or node_text(els[0]))
             if price is not None:
                 break
     if price is None:
-        m = re.search(r'€\s*([\d\.\s,]+)', raw)
+        m = RE_EURO.search(raw)
         if m:
             price = to_price(m.group(1))
 
     # ---- KILÓMETROS ----
     km = None
-    for sel in ('[data-testid="mileage"]', '[class*="mileage"]', '[class*="Mileage"]'):
-        el = card.select_one(sel)
-        if el:
-            km = to_int(el.get_text(" ", strip=True))
+    for xp in _card_km:
+        els = xp(card)
+        if els:
+            km = to_int(node_text(els[0]))
             if km is not None:
                 break
     if km is None:
-        m = re.search(r'(\d{1,3}(?:[.\s]\d{3})+|\d+)\s*km', raw, re.I)
+        m = RE_KM.search(raw)
         if m:
             km = to_int(m.group(1))
 
     # ---- AÑO ----
     year = None
-    for sel in ('[data-testid="first-registration"]',
-                '[class*="first-registration"]',
-                '[class*="FirstRegistration"]'):
-        el = card.select_one(sel)
-        if el:
-            m = re.search(r'(\d{4})', el.get_text(" ", strip=True))
+    for xp in _card_year:
+        els = xp(card)
+        if els:
+            m = RE_YEAR4.search(node_text(els[0]))
             if m:
                 year = int(m.group(1))
                 break
     if year is None:
-        m = re.search(r'(20\d{2}|201\d)', raw)
+        m = RE_YEAR.search(raw)
         if m:
             year = int(m.group(1))
 
@@ -121,19 +257,24 @@ def parse_card(card, base):
 
     # ---- IMAGEN ----
     img = ""
-    img_el = card.select_one("img")
-    if img_el:
+    img_el = _card_img(card)
+    if img_el is not None:
         img = (img_el.get("src")
                or img_el.get("data-src")
                or (img_el.get("data-srcset", "").split(" ")[0] if img_el.get("data-srcset") else ""))
 
+    return make_row(link, title, price, km, year, fuel, gearbox, img)
+
+
+def make_row(link, title, price, km, year, fuel, gearbox, img):
+    """Fila de listado común a tarjetas HTML y JSON embebido."""
     # ---- MARCA / MODELO ----
     parts = title.split()
     brand = parts[0] if parts else ""
     model = " ".join(parts[1:3]) if len(parts) > 2 else (parts[1] if len(parts) > 1 else "")
 
     return {
-        "listing_id": lid,
+        "listing_id": listing_id(link),
         "brand": brand,
         "model": model,
         "version": title,
@@ -148,68 +289,71 @@ def parse_card(card, base):
         "category": guess_category(title),
     }
 
+_det_ldjson = _xp("//script[@type='application/ld+json']/text()")
+_det_price = [_xp("//*[@data-testid='price-label']"), _xp("//*[@data-testid='ad-price']"),
+              _xp("//*[@itemprop='price']"), _xp("//*[contains(@class,'Price')]"),
+              _xp("//*[contains(@class,'price')]")]
+_det_km = [_xp("//*[@data-testid='mileage']"), _xp("//*[contains(@class,'mileage')]"),
+           _xp("//*[contains(@class,'Mileage')]")]
+_det_year = [_xp("//*[@data-testid='first-registration']"), _xp("//*[contains(@class,'first-registration')]"),
+             _xp("//*[contains(@class,'FirstRegistration')]")]
+_det_og = _xp("//meta[@property='og:image']/@content")
+_det_desc = _xp("(//*[@data-testid='description'] | //section[contains(@id,'descripcion')]"
+                " | //*[contains(@class,'Description')])[1]")
+
 def parse_detail_html(html):
-    """Extrae precio/km/año/combustible/cambio/potencia/imagen/IVA/descr de la ficha."""
-    soup = BeautifulSoup(html, "lxml")
-    text = soup.get_text(" ", strip=True)
+    """Extrae precio/km/año/combustible/cambio/potencia/imagen/IVA/descr de la ficha (un solo árbol lxml)."""
+    doc = html_doc(html)
+    text = node_text(doc)
+    low = text.lower()
     out = {}
 
     # -------- JSON-LD (si existe) --------
-    try:
-        import json
-        for s in soup.select('script[type="application/ld+json"]'):
-            try:
-                data = json.loads(s.string or "{}")
-                if isinstance(data, dict):
-                    offers = data.get("offers") or {}
-                    price = offers.get("price")
-                    if price is not None:
-                        out["price"] = to_price(str(price))
-                    # km en algunos ld+json no viene; lo seguiremos buscando
-            except Exception:
-                pass
-    except Exception:
-        pass
+    for raw in _det_ldjson(doc):
+        try:
+            data = json.loads(raw or "{}")
+            if isinstance(data, dict):
+                offers = data.get("offers") or {}
+                price = offers.get("price") if isinstance(offers, dict) else None
+                if price is not None:
+                    out["price"] = to_price(str(price))
+                # km en algunos ld+json no viene; lo seguiremos buscando
+        except Exception:
+            pass
 
     # -------- PRECIO (fallback en DOM/regex) --------
     if out.get("price") is None:
-        for sel in ('[data-testid="price-label"]',
-                    '[data-testid="ad-price"]',
-                    '[itemprop="price"]',
-                    '[class*="Price"]','[class*="price"]'):
-            el = soup.select_one(sel)
-            if el:
-                out["price"] = to_price(el.get("content") or el.get_text(" ", strip=True))
+        for xp in _det_price:
+            els = xp(doc)
+            if els:
+                out["price"] = to_price(els[0].get("content") or node_text(els[0]))
                 if out["price"] is not None: break
         if out.get("price") is None:
-            m = re.search(r'€\s*([\d\.\s,]+)', text)
+            m = RE_EURO.search(text)
             if m: out["price"] = to_price(m.group(1))
 
     # -------- KILÓMETROS --------
-    for sel in ('[data-testid="mileage"]','[class*="mileage"]','[class*="Mileage"]'):
-        el = soup.select_one(sel)
-        if el:
-            out["km"] = to_int(el.get_text(" ", strip=True))
+    for xp in _det_km:
+        els = xp(doc)
+        if els:
+            out["km"] = to_int(node_text(els[0]))
             if out["km"] is not None: break
     if out.get("km") is None:
-        m = re.search(r'(\d{1,3}(?:[.\s]\d{3})+|\d+)\s*km', text, re.I)
+        m = RE_KM.search(text)
         if m: out["km"] = to_int(m.group(1))
 
     # -------- AÑO (primera matriculación) --------
-    for sel in ('[data-testid="first-registration"]',
-                '[class*="first-registration"]','[class*="FirstRegistration"]'):
-        el = soup.select_one(sel)
-        if el:
-            m = re.search(r'(\d{4})', el.get_text(" ", strip=True))
+    for xp in _det_year:
+        els = xp(doc)
+        if els:
+            m = RE_YEAR4.search(node_text(els[0]))
             if m: out["year"] = int(m.group(1)); break
     if out.get("year") is None:
-        m = re.search(r'(\d{2}/)?(20\d{2}|201\d)', text)
+        m = RE_REG.search(text)
         if m:
-            yy = re.search(r'(20\d{2}|201\d)', m.group(0)).group(1)
-            out["year"] = int(yy)
+            out["year"] = int(m.group(2))
 
     # -------- COMBUSTIBLE / CAMBIO / POTENCIA --------
-    low = text.lower()
     if "diésel" in low or "diesel" in low: out["fuel"] = "Diésel"
     elif "gasolina" in low: out["fuel"] = "Gasolina"
     elif "híbrido" in low or "hibrido" in low: out["fuel"] = "Híbrido"
@@ -217,7 +361,7 @@ def parse_detail_html(html):
 
     out["gearbox"] = "Automático" if "automát" in low or "automatic" in low else ("Manual" if "manual" in low else out.get("gearbox",""))
 
-    m = re.search(r'(\d+)\s*kW.*?\((\d+)\s*CV\)', text)
+    m = RE_POWER.search(text)
     if m:
         out["power_kw"] = int(m.group(1))
         out["power_cv"] = int(m.group(2))
@@ -228,46 +372,574 @@ def parse_detail_html(html):
     elif "iva deducible" in low: out["vat_note"] = "IVA deducible"
 
     # -------- Imagen y descripción --------
-    og = soup.select_one('meta[property="og:image"]')
-    if og and og.get("content"): out["image"] = og["content"]
-    desc = soup.select_one('[data-testid="description"], section[id*="descripcion"], [class*="Description"]')
-    if desc:
-        out["desc_excerpt"] = clean(desc.get_text(" ", strip=True))[:800]
-    else:
-        out["desc_excerpt"] = clean(text)[:800]
+    og = _det_og(doc)
+    if og and og[0]: out["image"] = og[0]
+    desc = _det_desc(doc)
+    out["desc_excerpt"] = clean(node_text(desc[0]) if desc else text)[:800]
 
     return out
 
 
-def enrich_items_with_details(start_url, items, delay, limit=None):
-    """Abre cada ficha con Playwright y superpone datos fiables (precio/km/año…)."""
-    from playwright.sync_api import sync_playwright
+# Campos de la ficha que se superponen sobre la tarjeta del listado
+DETAIL_FIELDS = ["price","km","year","fuel","gearbox","vat_note","power_kw","power_cv","image","desc_excerpt"]
+
+def merge_detail(it, det):
+    """Superpone SOLO los campos de la ficha que traen valor."""
+    for k in DETAIL_FIELDS:
+        v = det.get(k)
+        if v not in (None,""):
+            it[k] = v
+    return it
+
+
+class RateLimiter:
+    """Presupuesto de cortesía global (navegaciones/seg), adaptativo AIMD con `max_rate` y reintentos con jitter."""
+    RETRY_AFTER_MAX = 120
+
+    def __init__(self, rate, max_rate=None, min_rate=None, increase=0.05, backoff=0.5, attempts=3, retry_base=2.0,
+                 metrics=None):
+        self.max_rate = float(max_rate) if max_rate else 0.0
+        self.rate = min(float(rate), self.max_rate or float(rate)) if rate else self.max_rate
+        self.min_rate = min(float(min_rate or 0.1), self.rate) if self.max_rate else self.rate
+        self.increase, self.backoff = float(increase), float(backoff)
+        self.attempts, self.retry_base = max(1, int(attempts)), float(retry_base)
+        self.m = metrics or RunMetrics()
+        self._next = self._cut_until = 0.0
+        self._first = self._last = None
+        self._count = 0
+        self._lock = threading.Lock()
+        self.m.gauge("rate_rps", round(self.rate, 3))
+
+    @classmethod
+    def from_cfg(cls, cfg, metrics=None):
+        """max_requests_per_second es el techo; sin él, ritmo fijo de una petición cada delay_seconds."""
+        top = cfg.get("max_requests_per_second")
+        retry = (int(cfg.get("retry_attempts", 3)), float(cfg.get("retry_base_seconds", 2.0)))
+        if not top:
+            delay = float(cfg.get("delay_seconds", 1.2))
+            return cls(1.0/delay if delay > 0 else None, attempts=retry[0], retry_base=retry[1], metrics=metrics)
+        if not cfg.get("adaptive_rate", True):
+            return cls(top, None, attempts=retry[0], retry_base=retry[1], metrics=metrics)
+        return cls(cfg.get("start_requests_per_second") or top, top, cfg.get("min_requests_per_second"),
+                   cfg.get("rate_increase", 0.05), cfg.get("rate_backoff", 0.5), *retry, metrics=metrics)
+
+    @property
+    def interval(self):
+        return 1.0/self.rate if self.rate else 0.0
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            # Peticiones/min logradas entre la primera y la última reserva
+            self._first = slot if self._first is None else self._first
+            self._last, self._count = slot, self._count + 1
+            span = self._last - self._first
+            rpm = (self._count - 1) * 60 / span if span > 0 else 0.0
+        self.m.inc("requests")
+        self.m.gauge("requests_per_minute", round(rpm, 1))
+        return slot - now
+
+    async def wait(self):
+        d = self._reserve()
+        if d > 0:
+            await asyncio.sleep(d)
 
-    ua = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-          "AppleWebKit/537.36 (KHTML, like Gecko) "
-          "Chrome/124.0.0.0 Safari/537.36")
+    def wait_sync(self):
+        d = self._reserve()
+        if d > 0:
+            time.sleep(d)
+
+    def ok(self):
+        """Respuesta sana: sube el ritmo (suma) hasta max_rate."""
+        if not self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+        self.m.gauge("rate_rps", round(self.rate, 3))
+
+    def throttled(self, reason, retry_after=None):
+        """La web frena (429/5xx, captcha/bloqueo, timeout): baja el ritmo (multiplica) y aplaza el siguiente hueco."""
+        self.m.inc(f"throttled_{reason}")
+        with self._lock:
+            now = time.monotonic()
+            # Varias páginas en paralelo ven el mismo frenazo: se recorta una vez por intervalo
+            if self.max_rate and now >= self._cut_until:
+                self.rate = max(self.min_rate, self.rate * self.backoff)
+                self._cut_until = now + self.interval
+            pause = min(retry_after, self.RETRY_AFTER_MAX) if retry_after else self.interval
+            self._next = max(self._next, now + pause)
+        self.m.gauge("rate_rps", round(self.rate, 3))
+
+    def observe(self, why, headers=None):
+        """Ajusta el ritmo según el resultado de una navegación; True si merece otro intento."""
+        if why is None:
+            self.ok()
+            return False
+        if why in ("gone", "empty"):
+            return False
+        self.throttled(why, retry_after(headers))
+        return True
+
+    def _retry_delay(self, attempt):
+        self.m.inc("retries")
+        return self.retry_base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+    async def retry_wait(self, attempt):
+        """Espera antes del reintento nº `attempt` (1, 2…): exponencial con jitter para no reintentar a la vez."""
+        await asyncio.sleep(self._retry_delay(attempt))
+
+    def retry_wait_sync(self, attempt):
+        time.sleep(self._retry_delay(attempt))
+
+def retry_after(headers):
+    """Segundos de la cabecera Retry-After (solo la forma numérica), o None."""
+    try:
+        v = (headers or {}).get("retry-after")
+        return float(v) if v else None
+    except (TypeError, ValueError):
+        return None
 
-    with sync_playwright() as p:
-        br = p.chromium.launch(headless=True, args=["--disable-blink-features=AutomationControlled"])
-        ctx = br.new_context(locale="es-ES", user_agent=ua, viewport={"width":1280,"height":2000})
-        ctx.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined});")
-        page = ctx.new_page()
+def throttle_reason(status, html="", ready=True):
+    """Motivo para frenar tras una respuesta ("429", "5xx", "captcha"), "empty"/"gone" (sin frenar) o None."""
+    if status == 429: return "429"
+    if status >= 500: return "5xx"
+    if status in (401, 403): return "captcha"
+    if status >= 400: return "gone"
+    if not ready:
+        return "captcha" if looks_blocked(status, html) else "empty"
+    return None
 
-        for i, it in enumerate(items):
-            if limit and i >= limit: break
+def nav_error(e):
+    """Motivo de una navegación que lanzó excepción (requests o Playwright)."""
+    return "timeout" if "Timeout" in type(e).__name__ else "error"
+
+
+# La ficha está lista cuando hay precio o JSON-LD en el DOM
+DETAIL_READY_SELECTOR = ("script[type='application/ld+json'], [data-testid='price-label'], "
+                         "[data-testid='ad-price'], [class*='Price']")
+
+COUNT_AND_SCROLL_JS = """(sel) => {
+  const n = document.querySelectorAll(sel).length;
+  window.scrollBy(0, document.body.scrollHeight);
+  return n;
+}"""
+
+GREW_JS = "([sel, n]) => document.querySelectorAll(sel).length > n"
+
+class PageWaits:
+    """Esperas tras navegar o hacer scroll: al selector y red en reposo (adaptive) o pausa fija de `delay` seg."""
+    def __init__(self, delay, adaptive=True, timeout_ms=4000, scroll_timeout_ms=1200, idle_ms=1500, metrics=None):
+        self.delay, self.adaptive = delay, adaptive
+        self.timeout_ms, self.scroll_timeout_ms, self.idle_ms = timeout_ms, scroll_timeout_ms, idle_ms
+        self.m = metrics or RunMetrics()
+
+    @classmethod
+    def from_cfg(cls, cfg, delay, metrics=None):
+        return cls(delay, bool(cfg.get("adaptive_wait", True)), int(cfg.get("wait_timeout_ms", 4000)),
+                   int(cfg.get("scroll_timeout_ms", 1200)), int(cfg.get("network_idle_ms", 1500)), metrics)
+
+    async def after_nav(self, page, selector=None):
+        """Tras navegar espera al selector; False si no apareció a tiempo (con pausa fija, siempre True)."""
+        with self.m.timer("wait"):
+            if not self.adaptive:
+                await page.wait_for_timeout(int(self.delay * 1000))
+                return True
+            ready = True
+            try:
+                await page.wait_for_selector(selector or CARD_SELECTOR, state="attached", timeout=self.timeout_ms)
+            except Exception:
+                self.m.inc("wait_timeouts")
+                ready = False
             try:
-                page.goto(it["link"], wait_until="domcontentloaded", timeout=60000)
-                page.wait_for_timeout(int(delay*1000))
-                det = parse_detail_html(page.content())
-                # Superpone SOLO si trae valor
-                for k in ["price","km","year","fuel","gearbox","vat_note","power_kw","power_cv","image","desc_excerpt"]:
-                    v = det.get(k)
-                    if v not in (None,""):
-                        it[k] = v
+                await page.wait_for_load_state("networkidle", timeout=self.idle_ms)
             except Exception:
                 pass
+            return ready
+
+    async def scroll(self, page):
+        """Scroll al final y espera a que carguen más tarjetas (o a que venza el tope)."""
+        n = await page.evaluate(COUNT_AND_SCROLL_JS, CARD_SELECTOR)
+        with self.m.timer("wait"):
+            if not self.adaptive:
+                return await page.wait_for_timeout(int(self.delay * 1000))
+            try:
+                await page.wait_for_function(GREW_JS, arg=[CARD_SELECTOR, n], timeout=self.scroll_timeout_ms)
+            except Exception:
+                pass
+
+
+class DetailCache:
+    """Cache en disco de fichas (HTML gzip + índice SQLite) con caducidad `ttl_hours` y LRU hasta `max_mb`."""
+    def __init__(self, root, ttl_hours=20, max_mb=200):
+        self.root = ensure_dir(root)
+        self.ttl = float(ttl_hours) * 3600
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        # Se usa desde el hilo del navegador (BrowserSession), nunca desde dos hilos a la vez
+        self.db = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries(
+            url TEXT PRIMARY KEY, file TEXT, fetched_at REAL, last_access REAL, size INTEGER, sha1 TEXT)""")
+        self.hits = self.misses = 0
+
+    def _file(self, url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html.gz"
+
+    def get(self, url):
+        """HTML de la ficha si hay una copia fresca; None si no."""
+        row = self.db.execute("SELECT file, fetched_at FROM entries WHERE url=?", (url,)).fetchone()
+        if not row or time.time() - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        try:
+            with gzip.open(os.path.join(self.root, row[0]), "rt", encoding="utf-8") as f:
+                html = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        with self.db:
+            self.db.execute("UPDATE entries SET last_access=? WHERE url=?", (time.time(), url))
+        self.hits += 1
+        return html
 
-        ctx.close(); br.close()
+    def put(self, url, html):
+        fname = self._file(url)
+        raw = gzip.compress(html.encode("utf-8"), compresslevel=6)
+        tmp = os.path.join(self.root, fname + ".part")
+        with open(tmp, "wb") as f: f.write(raw)
+        os.replace(tmp, os.path.join(self.root, fname))
+        now = time.time()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?,?)",
+                            (url, fname, now, now, len(raw), hashlib.sha1(html.encode("utf-8")).hexdigest()))
+        self._evict()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size),0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        with self.db:
+            for url, fname, size in self.db.execute(
+                    "SELECT url, file, size FROM entries ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.root, fname))
+                except FileNotFoundError:
+                    pass
+                self.db.execute("DELETE FROM entries WHERE url=?", (url,))
+                total -= size
+
+    def close(self):
+        self.db.close()
+
+
+# ----------------------- Bloqueo de recursos en Playwright -----------------------
+
+ALLOW_TYPES = ("document", "script", "xhr", "fetch", "stylesheet")
+BLOCK_DOMAINS = ("doubleclick.net", "googlesyndication.com", "googletagmanager.com", "google-analytics.com",
+                 "adservice.google.com", "facebook.net", "connect.facebook.net", "hotjar.com", "criteo.com",
+                 "criteo.net", "taboola.com", "outbrain.com", "adnxs.com", "bat.bing.com", "analytics.tiktok.com")
+DEFAULT_VIEWPORT = {"width": 1280, "height": 2000}
+# Tipos de recurso de CDP por su nombre en Playwright (sin Preflight: lo necesitan las xhr/fetch permitidas)
+CDP_TYPES = {t.lower(): t for t in ("Document", "Stylesheet", "Image", "Media", "Font", "Script", "TextTrack", "XHR",
+                                    "Fetch", "Prefetch", "EventSource", "WebSocket", "Manifest", "SignedExchange",
+                                    "Ping", "CSPViolationReport", "Other")}
+
+class ResourceBlocker:
+    """Bloquea por CDP (Fetch) recursos y dominios innecesarios sin desactivar la caché, y mide los bytes reales."""
+    def __init__(self, allow_types=ALLOW_TYPES, block_domains=BLOCK_DOMAINS, enabled=True, metrics=None):
+        self.allow_types = set(allow_types or ())
+        self.block_domains = tuple(d.lower().lstrip(".") for d in (block_domains or ()))
+        self.enabled = enabled
+        self.m = metrics or RunMetrics()
+        self.blocked, self.bytes, self.cached, self.lock = {}, 0, 0, threading.Lock()
+
+    @classmethod
+    def from_cfg(cls, cfg, metrics=None):
+        return cls(cfg.get("allow_resource_types") or ALLOW_TYPES,
+                   BLOCK_DOMAINS if cfg.get("block_domains") is None else cfg.get("block_domains"),
+                   bool(cfg.get("block_resources", True)), metrics)
+
+    def reason(self, url, resource_type):
+        """Motivo de bloqueo ("domain" o el tipo de recurso) o None si pasa."""
+        host = (urlparse(url).hostname or "").lower()
+        if any(host == d or host.endswith("." + d) for d in self.block_domains):
+            return "domain"
+        if resource_type not in self.allow_types:
+            return resource_type
+        return None
+
+    def patterns(self):
+        """Patrones de Fetch.enable: solo se pausa (y aborta) lo que se bloquea."""
+        pats = [{"urlPattern": p} for d in self.block_domains for p in (f"*://{d}/*", f"*://*.{d}/*")]
+        return pats + [{"resourceType": t} for k, t in CDP_TYPES.items() if k not in self.allow_types]
+
+    async def attach(self, ctx, page):
+        """Engancha a `page` la medida de bytes y, si está activo, el bloqueo (requiere Chromium)."""
+        try:
+            cdp = await ctx.new_cdp_session(page)
+        except Exception:
+            return
+        cdp.on("Network.loadingFinished", self._loaded)
+        cdp.on("Network.requestServedFromCache", self._from_cache)
+        await cdp.send("Network.enable")
+        if self.enabled:
+            cdp.on("Fetch.requestPaused", lambda ev: asyncio.ensure_future(self._block(cdp, ev)))
+            await cdp.send("Fetch.enable", {"patterns": self.patterns()})
+
+    async def _block(self, cdp, ev):
+        why = self.reason(ev.get("request", {}).get("url", ""), ev.get("resourceType", "Other").lower()) or "other"
+        with self.lock:
+            self.blocked[why] = self.blocked.get(why, 0) + 1
+        self.m.inc("blocked_requests")
+        try:
+            await cdp.send("Fetch.failRequest", {"requestId": ev["requestId"], "errorReason": "BlockedByClient"})
+        except Exception:
+            pass   # la página ya se cerró
+
+    def _loaded(self, ev):
+        n = int(ev.get("encodedDataLength") or 0)
+        with self.lock:
+            self.bytes += n
+        self.m.inc("browser_bytes", n)
+
+    def _from_cache(self, ev):
+        with self.lock:
+            self.cached += 1
+        self.m.inc("browser_cache_hits")
+
+    def summary(self):
+        with self.lock:
+            return (f"{sum(self.blocked.values())} peticiones bloqueadas {self.blocked}, "
+                    f"{self.bytes/2**20:.1f} MB descargados, {self.cached} respuestas de caché")
+
+
+# ----------------------- Sesión de navegador compartida -----------------------
+
+UA = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+      "AppleWebKit/537.36 (KHTML, like Gecko) "
+      "Chrome/124.0.0.0 Safari/537.36")
+LAUNCH_ARGS = ("--disable-blink-features=AutomationControlled",)
+WEBDRIVER_JS = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined});"
+# Banner de cookies en un solo selector (una ida y vuelta por comprobación)
+CONSENT_SELECTOR = ('button:has-text("Aceptar"), button:has-text("Allow all"), '
+                    '[id*=onetrust-accept], :text("Aceptar")')
+# Si el banner no aparece en estas primeras páginas, no se vuelve a buscar
+CONSENT_TRIES = 3
+
+class BrowserSession:
+    """Un solo Chromium por ejecución (listado y fichas) en su propio bucle asyncio, con las cookies guardadas."""
+    def __init__(self, state_path=None, state_max_days=7, headless=True, args=LAUNCH_ARGS, user_agent=UA,
+                 viewport=None, blocker=None, metrics=None):
+        self.state_path, self.headless, self.args = state_path, headless, list(args or ())
+        self.user_agent, self.viewport, self.blocker = user_agent, viewport or DEFAULT_VIEWPORT, blocker
+        self.m = metrics or RunMetrics()
+        self.loaded = self._fresh(state_max_days)
+        self.consented, self.consent_checks = False, 0
+        self.loop = self.thread = self.pw = self.browser = self.ctx = self._lock = self.error = None
+
+    @classmethod
+    def from_cfg(cls, cfg, outdir, metrics=None):
+        state = cfg.get("browser_state_file", "browser_state.json")
+        return cls(os.path.join(outdir, state) if state else None, float(cfg.get("browser_state_max_days", 7)),
+                   bool(cfg.get("headless", True)), cfg.get("browser_args") or LAUNCH_ARGS, UA,
+                   cfg.get("viewport"), ResourceBlocker.from_cfg(cfg, metrics), metrics)
+
+    def _fresh(self, max_days):
+        try:
+            return time.time() - os.path.getmtime(self.state_path) < max_days * 86400
+        except (OSError, TypeError):
+            return False
+
+    def run(self, coro):
+        """Ejecuta `coro` en el bucle del navegador y devuelve su resultado (para código síncrono)."""
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, name="browser", daemon=True)
+            self.thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def context(self):
+        """Contexto compartido; la primera llamada lanza Chromium (un arranque fallido no se reintenta)."""
+        self._lock = self._lock or asyncio.Lock()
+        async with self._lock:
+            if self.error is not None:
+                raise self.error
+            if self.ctx is None:
+                from playwright.async_api import async_playwright
+                with self.m.timer("browser_launch"):
+                    self.pw = await async_playwright().start()
+                    try:
+                        self.browser = await self.pw.chromium.launch(headless=self.headless, args=self.args)
+                    except Exception as e:
+                        self.error = e
+                        await self.pw.stop()
+                        raise
+                    self.ctx = await self.browser.new_context(
+                        locale="es-ES", user_agent=self.user_agent, viewport=self.viewport,
+                        storage_state=self.state_path if self.loaded else None)
+                    await self.ctx.add_init_script(WEBDRIVER_JS)
+                self.m.inc("browser_launches")
+                print("[BROWSER] Chromium lanzado" + (" con las cookies guardadas" if self.loaded else ""))
+        return self.ctx
+
+    async def new_page(self):
+        """Página del contexto compartido con el ResourceBlocker enganchado."""
+        ctx = await self.context()
+        page = await ctx.new_page()
+        if self.blocker:
+            await self.blocker.attach(ctx, page)
+        return page
+
+    async def accept_cookies(self, page):
+        """Acepta el banner de cookies mientras no haya consentimiento (de esta ejecución o guardado)."""
+        if self.consented:
+            return
+        self.consent_checks += 1
+        # Con cookies guardadas basta con mirar la primera página
+        if self.loaded or self.consent_checks >= CONSENT_TRIES:
+            self.consented = True
+        try:
+            el = page.locator(CONSENT_SELECTOR).first
+            if await el.is_visible():
+                await el.click(timeout=1200)
+                self.consented = True
+                self.m.inc("consent_clicks")
+                await self.save_state()
+        except Exception:
+            pass
+
+    async def save_state(self):
+        if self.ctx is None or not self.state_path:
+            return
+        ensure_dir(os.path.dirname(self.state_path) or ".")
+        tmp = f"{self.state_path}.{os.getpid()}.part"
+        await self.ctx.storage_state(path=tmp)
+        os.replace(tmp, self.state_path)
+
+    async def _close(self):
+        if self.ctx is None:
+            return
+        if self.consented:
+            await self.save_state()  # renueva las cookies para la próxima ejecución
+        await self.ctx.close(); await self.browser.close(); await self.pw.stop()
+        self.ctx = None
+        if self.blocker:
+            print(f"[BROWSER] {self.blocker.summary()}")
+
+    def close(self):
+        if self.loop is None:
+            return
+        try:
+            self.run(self._close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(); self.loop.close()
+            self.loop = None
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+def _enrich_cached(it, cache, m, lock=None):
+    """Enriquece desde la copia en cache si la hay (sin navegar); True si la había."""
+    html = cache.get(it["link"]) if cache and it.get("link") else None
+    if html is None:
+        return False
+    with m.timer("parse"):
+        det = parse_detail_html(html)
+    with lock or nullcontext():
+        merge_detail(it, det)
+        it["enriched_on"] = date.today().isoformat()
+    m.inc("cache_hits")
+    return True
+
+async def _enrich_one(session, page, it, waits, limiter, cache, m, lock=None):
+    """Abre la ficha en `page` y la superpone al item, reintentando los frenazos; False si no se logra."""
+    for attempt in range(limiter.attempts):
+        if attempt:
+            await limiter.retry_wait(attempt)
+        with m.timer("politeness_wait"):
+            await limiter.wait()
+        headers = None
+        try:
+            with m.timer("navigation"):
+                resp = await page.goto(it["link"], wait_until="domcontentloaded", timeout=60000)
+            ready = await waits.after_nav(page, DETAIL_READY_SELECTOR)
+            await session.accept_cookies(page)
+            with m.timer("serialize"):
+                html = await page.content()
+            headers = resp.headers if resp else None
+            why = throttle_reason(resp.status if resp else 200, html, ready)
+        except Exception as e:
+            why = nav_error(e)
+        if not limiter.observe(why, headers):
+            break
+    if why not in (None, "empty"):
+        m.inc("failures")
+        return False
+    try:
+        # una ficha sin el contenido esperado se aprovecha, pero no se guarda en cache
+        if cache and why is None:
+            cache.put(it["link"], html)
+        with m.timer("parse"):
+            det = parse_detail_html(html)
+        with lock or nullcontext():
+            merge_detail(it, det)
+            it["enriched_on"] = date.today().isoformat()
+        m.inc("details")
+        return True
+    except Exception:
+        m.inc("failures")
+        return False
+
+async def _enrich_async(session, items, waits, concurrency, limiter, cache=None, on_item=None, metrics=None):
+    m = metrics or RunMetrics()
+    queue = asyncio.Queue()
+    for it in items:
+        queue.put_nowait(it)
+    await session.context()
+
+    async def worker():
+        page = await session.new_page()
+        while True:
+            try:
+                it = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if await _enrich_one(session, page, it, waits, limiter, cache, m) and on_item:
+                on_item(it)
+        await page.close()
+
+    n = max(1, min(int(concurrency or 1), len(items)))
+    await asyncio.gather(*[worker() for _ in range(n)])
+
+
+def enrich_items_with_details(start_url, items, delay, limit=None, concurrency=1, rate=None, cache=None, on_item=None,
+                              metrics=None, limiter=None, waits=None, blocker=None, viewport=None, session=None):
+    """Abre las fichas con Playwright en `concurrency` páginas a la vez y superpone datos fiables (precio/km/año…)."""
+    m = metrics or RunMetrics()
+    limiter = limiter or RateLimiter(rate, metrics=m)
+    waits = waits or PageWaits(delay, metrics=m)
+    todo = items[:limit] if limit else items
+    if cache:
+        pending = []
+        for it in todo:
+            if not _enrich_cached(it, cache, m):
+                pending.append(it)
+            elif on_item:
+                on_item(it)
+        print(f"[DETAIL] cache: {len(todo)-len(pending)} fichas sin navegar, {len(pending)} a descargar")
+        todo = pending
+    if todo:
+        own = session is None
+        session = session or BrowserSession(viewport=viewport, blocker=blocker, metrics=m)
+        try:
+            session.run(_enrich_async(session, todo, waits, concurrency, limiter, cache, on_item, m))
+        finally:
+            if own:
+                session.close()
     return items
 
 def add_page(url, n):
@@ -276,43 +948,104 @@ def add_page(url, n):
     qs["page"] = str(n)
     return urlunparse((pr.scheme, pr.netloc, pr.path, pr.params, urlencode(qs, doseq=True), pr.fragment))
 
-def collect_autoscout(start_url, delay, max_pages):
+CARD_SELECTOR = "article, [data-testid='result-list'] article, [class*='ListItem_wrapper__'], [data-item-name='listing']"
+
+# Devuelve el outerHTML SOLO de las tarjetas aún no procesadas y las marca en el DOM.
+# Las que todavía no tienen enlace (esqueletos lazy) se dejan para la siguiente pasada;
+# las anidadas dentro de una tarjeta ya devuelta se marcan sin volver a enviarlas.
+NEW_CARDS_JS = """(sel) => {
+  const out = [];
+  for (const el of document.querySelectorAll(sel)) {
+    if (el.dataset.lcSeen) continue;
+    if (el.parentElement && el.parentElement.closest('[data-lc-seen]')) { el.dataset.lcSeen = '1'; continue; }
+    if (!el.querySelector('a[href]')) continue;
+    el.dataset.lcSeen = '1';
+    out.push(el.outerHTML);
+  }
+  return out;
+}"""
+
+# Última página según los enlaces de paginación y/o el contador de resultados
+LAST_PAGE_JS = """() => {
+  let last = 0;
+  for (const a of document.querySelectorAll('a[href*="page="]')) {
+    const m = a.href.match(/[?&]page=(\\d+)/); if (m) last = Math.max(last, +m[1]);
+  }
+  for (const el of document.querySelectorAll('nav li, [class*="agination"] li, [class*="agination"] button')) {
+    const t = (el.textContent || '').trim(); if (/^\\d+$/.test(t)) last = Math.max(last, +t);
+  }
+  const m = (document.body.innerText || '').match(/(\\d[\\d.]*)\\s+(?:resultados|ofertas|anuncios|vehículos)/i);
+  return {last: last, total: m ? parseInt(m[1].replace(/\\./g, ''), 10) : 0};
+}"""
+
+STRATEGIES = ("scroll", "next", "page_param")
+MAX_LOST_PAGES = 3
+
+def page_number(url, default=None):
+    """Número de página del parámetro ?page=N (o `default` si no lo trae)."""
+    v = dict(parse_qsl(urlparse(url).query)).get("page")
+    return int(v) if v and v.isdigit() else default
+
+def collect_autoscout(start_url, delay, max_pages, extraction="incremental", strategies=STRATEGIES, checkpoint=None,
+                      metrics=None, limiter=None, waits=None, blocker=None, viewport=None, session=None):
     """
-    Recorre el perfil con 3 estrategias SIEMPRE:
-    1) Scroll en página actual
-    2) Botón 'Siguiente' si existe
-    3) Barrido ?page=N hasta que no haya crecimiento (2 páginas seguidas sin nuevos)
+    Recorre el perfil por frontera de páginas, cada una UNA vez:
+    1) Scroll en página inicial  2) Botón 'Siguiente'
+    3) ?page=N para las que falten hasta la última (o 2 páginas seguidas sin nuevos)
     """
-    from playwright.sync_api import sync_playwright
-    rows, seen = [], set()
-
-    def page_url(url, n):
-        pr = urlparse(url)
-        qs = dict(parse_qsl(pr.query))
-        qs["page"] = str(n)
-        return urlunparse((pr.scheme, pr.netloc, pr.path, pr.params, urlencode(qs, doseq=True), pr.fragment))
-
-    def extract_on(page, base):
-        soup = BeautifulSoup(page.content(), "lxml")
-        cards = soup.select(
-            "article, [data-testid='result-list'] article, [class*='ListItem_wrapper__'], [data-item-name='listing']"
-        )
-        new = []
-        for c in cards:
-            r = parse_card(c, base)
-            if r and r.get("listing_id") and r["listing_id"] not in seen:
-                new.append(r)
+    m = metrics or RunMetrics()
+    limiter = limiter or RateLimiter(1.0 / delay if delay else None, metrics=m)
+    waits = waits or PageWaits(delay, metrics=m)
+    own = session is None
+    session = session or BrowserSession(viewport=viewport, blocker=blocker, metrics=m)
+    try:
+        rows, _ = session.run(_collect_async(session, start_url, max_pages, extraction, strategies, checkpoint,
+                                             m, limiter, waits))
+        return rows
+    finally:
+        if own:
+            session.close()
+
+async def _collect_async(session, start_url, max_pages, extraction, strategies, checkpoint, m, limiter, waits,
+                         on_rows=None):
+    """Listado con Playwright; devuelve (filas, completo) y completo=False si alguna página no llegó a cargar."""
+    rows = list(checkpoint.cards) if checkpoint else []
+    seen = set(r["listing_id"] for r in rows)
+    stats = {"bytes_parsed": 0}
+    visited = set(checkpoint.visited) if checkpoint else set()
+
+    async def page_done(n, before):
+        m.inc("pages"); m.inc("cards", len(rows) - before)
+        if checkpoint:
+            checkpoint.page_done(n, rows[before:], last_page)
+        if on_rows and len(rows) > before:
+            await on_rows(rows[before:])
+
+    async def extract_on(page, base):
+        with m.timer("serialize"):
+            if extraction == "full":
+                html = await page.content()
+                stats["bytes_parsed"] += len(html)
+            else:
+                frags = await page.evaluate(NEW_CARDS_JS, CARD_SELECTOR)
+                stats["bytes_parsed"] += sum(len(h) for h in frags)
+        new, ids = [], set()
+        with m.timer("parse"):
+            cards = CARD_XPATH(html_doc(html)) if extraction == "full" else [html_fragment(h) for h in frags]
+            for c in cards:
+                r = parse_card(c, base)
+                if r and r.get("listing_id") and r["listing_id"] not in seen and r["listing_id"] not in ids:
+                    new.append(r); ids.add(r["listing_id"])
         return new
 
-    def scroll_and_collect(page, base, max_scrolls=15, stagnation_limit=3):
-        last_len = len(rows)
+    async def scroll_and_collect(page, base, source, page_no, max_scrolls=15, stagnation_limit=3):
         stagnant = 0
         for _ in range(max_scrolls):
-            page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-            page.wait_for_timeout(int(delay * 1000))
-            got = extract_on(page, base)
+            await waits.scroll(page)
+            got = await extract_on(page, base)
             added = 0
             for r in got:
+                r["source"] = source; r["page_no"] = page_no
                 rows.append(r); seen.add(r["listing_id"]); added += 1
             if added == 0:
                 stagnant += 1
@@ -321,94 +1054,733 @@ def collect_autoscout(start_url, delay, max_pages):
             if stagnant >= stagnation_limit:
                 break
 
-    with sync_playwright() as p:
-        ua = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-              "AppleWebKit/537.36 (KHTML, like Gecko) "
-              "Chrome/124.0.0.0 Safari/537.36")
-        browser = p.chromium.launch(headless=True, args=["--disable-blink-features=AutomationControlled"])
-        ctx = browser.new_context(locale="es-ES", user_agent=ua, viewport={"width": 1280, "height": 2000})
-        ctx.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined});")
-        page = ctx.new_page()
-        base = f"{urlparse(start_url).scheme}://{urlparse(start_url).netloc}"
-
-        def accept_cookies():
-            for sel in [
-                'button:has-text("Aceptar")',
-                'button:has-text("Aceptar todo")',
-                'text=Aceptar',
-                'button:has-text("Allow all")',
-                '[id*=onetrust-accept]'
-            ]:
-                try:
-                    el = page.locator(sel).first
-                    if el.is_visible():
-                        el.click(timeout=1200); return
-                except: pass
+    async def navigate(page, url=None, click=None, strict=False):
+        """goto (o clic) en el turno del limiter; devuelve None si cargó o el motivo del último fallo."""
+        for attempt in range(1 if click is not None else limiter.attempts):
+            if attempt:
+                await limiter.retry_wait(attempt)
+            with m.timer("politeness_wait"):
+                await limiter.wait()
+            try:
+                with m.timer("navigation"):
+                    if click is not None:
+                        resp = await click.click(timeout=2000)
+                    else:
+                        resp = await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+            except Exception as e:
+                if click is not None:
+                    raise
+                why = nav_error(e)
+                limiter.throttled(why)
+                if strict and attempt == limiter.attempts - 1:
+                    raise
+                continue
+            ready = await waits.after_nav(page)
+            await session.accept_cookies(page)
+            why = throttle_reason(resp.status if resp else 200, "" if ready else await page.content(), ready)
+            if not limiter.observe(why, resp.headers if resp else None):
+                break
+        return why
+
+    async def detect_last_page(page, per_page):
+        try:
+            info = await page.evaluate(LAST_PAGE_JS)
+        except Exception:
+            return None
+        last = int(info.get("last") or 0)
+        total = int(info.get("total") or 0)
+        if total and per_page:
+            last = max(last, -(-total // per_page))
+        return min(last, max_pages) if last else None
 
-        # 1) Página inicial
-        page.goto(start_url, wait_until="domcontentloaded", timeout=60000)
-        accept_cookies()
-        scroll_and_collect(page, base, max_scrolls=18, stagnation_limit=3)
-        print(f"[LISTING] Página 1: total {len(rows)}")
+    async def grow_frontier(page):
+        # La paginación de la página 1 puede no llegar a la última: la frontera crece con cada página
+        nonlocal last_page
+        lp = await detect_last_page(page, per_page)
+        if lp and lp > (last_page or 0):
+            last_page = lp
+
+    page = await session.new_page()
+    base = f"{urlparse(start_url).scheme}://{urlparse(start_url).netloc}"
+    lost_pages = []
+    try:
+        # 1) Página inicial (salvo que venga ya en el checkpoint)
+        first_no = page_number(start_url, 1)
+        last_page = checkpoint.last_page if checkpoint else None
+        per_page = 0
+        resumed = first_no in visited
+        if not resumed:
+            why = await navigate(page, start_url, strict=True)
+            if why not in (None, "empty"):
+                # sin la página 1 no hay listado: no se da por visitada para que --resume la repita
+                raise RuntimeError(f"Página {first_no} sin cargar tras {limiter.attempts} intentos ({why})")
+            visited.add(first_no)
+            await scroll_and_collect(page, base, "scroll", first_no, max_scrolls=18, stagnation_limit=3)
+            per_page = len(rows)
+            await grow_frontier(page)
+            await page_done(first_no, 0)
+            print(f"[LISTING] Página {first_no}: total {len(rows)} ({stats['bytes_parsed']//1024} KB parseados, "
+                  f"última página: {last_page or '?'})")
 
-        # 2) Botón “Siguiente”
-        page_no = 1
-        while page_no < max_pages:
-            page_no += 1
+        # 2) Botón “Siguiente” (solo mientras lleve a páginas nuevas)
+        page_no = first_no
+        while "next" in strategies and not resumed and page_no < max_pages and not (last_page and page_no >= last_page):
             clicked = False
             for sel in ['a[rel="next"]', 'a:has-text("Siguiente")', '[data-testid*=next]', 'button:has-text("Siguiente")']:
                 try:
                     nxt = page.locator(sel).first
-                    if nxt.is_visible():
-                        nxt.click(timeout=2000)
-                        clicked = True
-                        page.wait_for_timeout(int(delay * 1000))
-                        accept_cookies()
+                    if await nxt.is_visible():
+                        # Si la página llega frenada no se da por visitada: la recupera ?page=N
+                        clicked = await navigate(page, click=nxt) is None
                         break
                 except: pass
             if not clicked:
                 break
-            before = len(rows)
-            scroll_and_collect(page, base, max_scrolls=12, stagnation_limit=2)
-            print(f"[LISTING] Página {page_no} (botón): +{len(rows)-before} (total {len(rows)})")
+            page_no = page_number(page.url, page_no + 1)
+            if page_no in visited:
+                break
+            visited.add(page_no)
+            before, b0 = len(rows), stats["bytes_parsed"]
+            await scroll_and_collect(page, base, "next", page_no, max_scrolls=12, stagnation_limit=2)
+            await grow_frontier(page)
+            await page_done(page_no, before)
+            print(f"[LISTING] Página {page_no} (botón): +{len(rows)-before} (total {len(rows)}, {(stats['bytes_parsed']-b0)//1024} KB parseados)")
             if len(rows) == before:
                 break
 
-        # 3) Barrido ?page=N SIEMPRE, hasta no crecer
-        no_growth = 0
-        last_total = len(rows)
-        for n in range(2, max_pages + 1):
-            url_n = page_url(start_url, n)
-            try:
-                page.goto(url_n, wait_until="domcontentloaded", timeout=60000)
-            except:
+        # 3) ?page=N solo para las páginas de la frontera aún no visitadas
+        # (una página aún frenada tras los reintentos se salta; MAX_LOST_PAGES seguidas cortan)
+        no_growth = lost = 0
+        n = 1 if "page_param" in strategies else max_pages
+        while n < min(last_page or max_pages, max_pages):
+            n += 1
+            if n in visited:
+                continue
+            why = await navigate(page, add_page(start_url, n))
+            if why == "gone":
                 break
-            page.wait_for_timeout(int(delay * 1000))
-            accept_cookies()
-            before = len(rows)
-            scroll_and_collect(page, base, max_scrolls=10, stagnation_limit=2)
+            if why not in (None, "empty"):
+                m.inc("failures")
+                lost += 1; lost_pages.append(n)
+                print(f"[LISTING] Página {n} (?page): sin cargar tras {limiter.attempts} intentos ({why})")
+                if lost >= MAX_LOST_PAGES:
+                    break
+                continue
+            lost = 0
+            visited.add(n)
+            before, b0 = len(rows), stats["bytes_parsed"]
+            await scroll_and_collect(page, base, "page_param", n, max_scrolls=10, stagnation_limit=2)
+            await grow_frontier(page)
+            await page_done(n, before)
             added = len(rows) - before
-            print(f"[LISTING] Página {n} (?page): +{added} (total {len(rows)})")
-            if len(rows) == last_total:
-                no_growth += 1
-            else:
-                no_growth = 0
-            last_total = len(rows)
+            print(f"[LISTING] Página {n} (?page): +{added} (total {len(rows)}, {(stats['bytes_parsed']-b0)//1024} KB parseados)")
+            no_growth = no_growth + 1 if added == 0 else 0
             if no_growth >= 2:
                 break
+    finally:
+        await page.close()
+
+    by_source = {}
+    for r in rows:
+        by_source[r["source"]] = by_source.get(r["source"], 0) + 1
+    print(f"[LISTING] Páginas visitadas: {len(visited)} · fichas por estrategia: {by_source}"
+          + (f" · sin cargar: {lost_pages}" if lost_pages else ""))
+    return rows, not lost_pages
 
-        ctx.close(); browser.close()
 
+# ----------------------- Listado por HTTP (sin navegador) -----------------------
+
+def make_session(pool=8, retries=2, status_forcelist=(500, 502, 503, 504)):
+    """requests.Session con keep-alive, pool de conexiones y reintentos (conexión y `status_forcelist`)."""
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    s = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=status_forcelist or (),
+                  allowed_methods=("GET", "HEAD"), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=retry)
+    s.mount("https://", adapter); s.mount("http://", adapter)
+    s.headers.update({"User-Agent": UA, "Accept-Language": "es-ES,es;q=0.9"})
+    return s
+
+# Marcas propias de las páginas de bloqueo (Cloudflare, DataDome, PerimeterX, Akamai); no basta
+# "captcha" suelto: las páginas normales cargan scripts de reCAPTCHA
+BLOCK_MARKERS = ("cf-challenge", "challenge-platform", "captcha-delivery.com", "px-captcha",
+                 "<title>access denied</title>", "attention required! | cloudflare", "are you a robot")
+
+def retry_history(resp):
+    """Intentos fallidos que reintentó urllib3 (Retry del HTTPAdapter) para obtener esta respuesta."""
+    retries = getattr(getattr(resp, "raw", None), "retries", None)
+    return getattr(retries, "history", ()) or ()
+
+def count_retries(resp):
+    return len(retry_history(resp))
+
+def looks_blocked(status, html):
+    if status in (401, 403, 429, 503):
+        return True
+    head = (html or "")[:20000].lower()
+    return any(k in head for k in BLOCK_MARKERS)
+
+def _dig(d, *keys):
+    for k in keys:
+        if not isinstance(d, dict): return None
+        d = d.get(k)
+    return d
+
+def _row_from_json(d, base):
+    """Anuncio del JSON embebido (__NEXT_DATA__ o JSON-LD) -> fila de listado."""
+    link = d.get("url") or _dig(d, "item", "url") or ""
+    if not link:
+        return None
+    if not link.startswith("http"):
+        link = base + link
+    v = d.get("vehicle") or {}
+    title = clean(" ".join(str(x) for x in (v.get("make"), v.get("model"), v.get("modelVersionInput")) if x)
+                  or d.get("name") or "")
+    price = (to_price(_dig(d, "tracking", "price")) or to_price(_dig(d, "price", "priceFormatted"))
+             or to_price(_dig(d, "offers", "price")))
+    km = to_int(_dig(d, "tracking", "mileage") or v.get("mileageInKm") or _dig(d, "mileageFromOdometer", "value"))
+    m = re.search(r"(\d{4})", str(_dig(d, "tracking", "firstRegistration") or d.get("vehicleModelDate")
+                                   or d.get("productionDate") or ""))
+    year = int(m.group(1)) if m else None
+    fuel = clean(str(v.get("fuel") or d.get("fuelType") or ""))
+    gearbox = clean(str(v.get("transmission") or d.get("vehicleTransmission") or ""))
+    imgs = d.get("images") or d.get("image") or ""
+    img = imgs[0] if isinstance(imgs, list) and imgs else (imgs if isinstance(imgs, str) else "")
+    return make_row(link, title, price, km, year, fuel, gearbox, img)
+
+_next_data = _xp("//script[@id='__NEXT_DATA__']/text()")
+
+def parse_listing_html(html, base):
+    """Fichas de una página de listado sin navegador (__NEXT_DATA__, JSON-LD o tarjetas); devuelve (filas, última_página)."""
+    doc = html_doc(html)
+    nd = _next_data(doc)
+    if nd:
+        try:
+            props = _dig(json.loads(nd[0]), "props", "pageProps") or {}
+            ls = props.get("listings") or []
+            rows = [r for r in (_row_from_json(x, base) for x in ls if isinstance(x, dict)) if r]
+            if rows:
+                return rows, to_int(props.get("numberOfPages"))
+        except Exception:
+            pass
+    for raw in _det_ldjson(doc):
+        try:
+            data = json.loads(raw or "{}")
+        except Exception:
+            continue
+        if isinstance(data, dict) and data.get("@type") == "ItemList":
+            els = [e.get("item", e) for e in data.get("itemListElement") or [] if isinstance(e, dict)]
+            rows = [r for r in (_row_from_json(x, base) for x in els) if r]
+            if rows:
+                return rows, None
+    rows = [r for r in (parse_card(c, base) for c in CARD_XPATH(doc)) if r and r.get("listing_id")]
+    return rows, None
+
+def collect_http(start_url, delay, max_pages, session=None, fixture_dir=None, checkpoint=None, metrics=None,
+                 limiter=None, on_rows=None):
+    """Recorre ?page=N con requests; devuelve (filas, ok) y ok=False si hay que completar con Playwright."""
+    m = metrics or RunMetrics()
+    limiter = limiter or RateLimiter(1.0 / delay if delay else None, metrics=m)
+    base = f"{urlparse(start_url).scheme}://{urlparse(start_url).netloc}"
+    # Sin reintentos por estado: el 429/5xx real llega al limiter, que es quien reintenta y frena
+    session = session or (None if fixture_dir else make_session(status_forcelist=()))
+    rows = list(checkpoint.cards) if checkpoint else []
+    seen = set(r["listing_id"] for r in rows)
+    visited = set(checkpoint.visited) if checkpoint else set()
+    last_page = checkpoint.last_page if checkpoint else None
+    parsed = bool(visited)
+    for n in range(1, max_pages + 1):
+        if last_page and n > last_page:
+            break
+        if n in visited:
+            continue
+        if fixture_dir:
+            fp = os.path.join(fixture_dir, f"page_{n}.html")
+            if not os.path.exists(fp):
+                break
+            with open(fp, "r", encoding="utf-8") as f: status, html = 200, f.read()
+        else:
+            # 429/5xx, bloqueo o timeout: el limiter frena y se reintenta la página con jitter
+            for attempt in range(limiter.attempts):
+                if attempt:
+                    limiter.retry_wait_sync(attempt)
+                with m.timer("politeness_wait"):
+                    limiter.wait_sync()
+                status, html, headers = None, "", None
+                try:
+                    with m.timer("navigation"):
+                        r = session.get(add_page(start_url, n) if n > 1 else start_url, timeout=30)
+                        status, html, headers = r.status_code, r.text, r.headers
+                    m.inc("retries", count_retries(r))
+                    # fallos de conexión que urllib3 ya reintentó por su cuenta: también son frenazos
+                    for h in retry_history(r)[-1:]:
+                        limiter.throttled(throttle_reason(h.status) if h.status else nav_error(h.error))
+                    why = throttle_reason(status, html, not looks_blocked(status, html))
+                except requests.RequestException as e:
+                    why = nav_error(e)
+                if not limiter.observe(why, headers):
+                    break
+            if status is None:
+                m.inc("failures")
+                return rows, False
+        if status in (404, 410) and parsed:
+            # la página tras la última (sin numberOfPages en el HTML): fin normal
+            print(f"[LISTING/HTTP] Página {n}: HTTP {status}, fin del listado")
+            break
+        if looks_blocked(status, html) or status != 200:
+            print(f"[LISTING/HTTP] Página {n}: bloqueada o HTTP {status}")
+            m.inc("failures")
+            return rows, False
+        m.inc("pages"); parsed = True
+        with m.timer("parse"):
+            got, lp = parse_listing_html(html, base)
+        last_page = last_page or lp
+        new = []
+        for r in got:
+            if r["listing_id"] in seen: continue
+            r["source"] = "http"; r["page_no"] = n
+            rows.append(r); seen.add(r["listing_id"]); new.append(r)
+        added = len(new)
+        m.inc("cards", added)
+        if checkpoint and added:
+            checkpoint.page_done(n, new, last_page)
+        if on_rows and added:
+            on_rows(new)
+        print(f"[LISTING/HTTP] Página {n}: +{added} (total {len(rows)}, {len(html)//1024} KB)")
+        if added == 0:
+            # vacía: fin normal si no sabemos la última página y ya hay datos
+            return rows, bool(rows) and not last_page
+    return rows, True
+
+def collect_listings(cfg, checkpoint=None, metrics=None, limiter=None, session=None):
+    """HTTP primero; Playwright solo si el camino rápido no completa el listado."""
+    own = session is None
+    session = session or BrowserSession(viewport=cfg.get("viewport"), blocker=ResourceBlocker.from_cfg(cfg, metrics),
+                                        metrics=metrics)
+    try:
+        rows, _ = session.run(_listings_async(cfg, checkpoint, metrics, limiter, session))
+        return rows
+    finally:
+        if own:
+            session.close()
+
+async def _listings_async(cfg, checkpoint, metrics, limiter, session, on_rows=None):
+    """collect_listings en el bucle del navegador; devuelve (filas, completo) y `on_rows(filas)` recibe cada página nueva."""
+    m = metrics or RunMetrics()
+    if checkpoint and checkpoint.stage != "listing":
+        print(f"[LISTING] Reanudado: {len(checkpoint.cards)} fichas del checkpoint")
+        if on_rows:
+            await on_rows(list(checkpoint.cards))
+        return checkpoint.cards, True
+    start_url = cfg.get("start_url")
+    delay = float(cfg.get("delay_seconds",1.2))
+    maxp  = int(cfg.get("max_pages",300))
+    mode = cfg.get("listing_mode", "http_first")
+    limiter = limiter or RateLimiter.from_cfg(cfg, m)
+    browse = lambda: _collect_async(session, start_url, maxp, cfg.get("extraction_mode","incremental"),
+                                    tuple(cfg.get("listing_strategies") or STRATEGIES), checkpoint, m,
+                                    limiter, PageWaits.from_cfg(cfg, delay, m), on_rows)
+    if on_rows and checkpoint and checkpoint.cards:
+        await on_rows(list(checkpoint.cards))
+    loop = asyncio.get_running_loop()
+    feed = (lambda rs: asyncio.run_coroutine_threadsafe(on_rows(rs), loop).result()) if on_rows else None
+    rows, complete = [], True
+    if mode in ("http_first", "http"):
+        rows, complete = await asyncio.to_thread(collect_http, start_url, delay, maxp,
+                                                 fixture_dir=cfg.get("listing_fixture_dir"), checkpoint=checkpoint,
+                                                 metrics=m, limiter=limiter, on_rows=feed)
+        if not complete and mode != "http":
+            print(f"[LISTING] HTTP incompleto ({len(rows)} fichas): sigo con Playwright")
+            more, complete = await browse()
+            rows = _merge_rows(rows, more)
+    else:
+        rows, complete = await browse()
+    # Un listado incompleto sigue en la etapa "listing": --resume reintenta solo las páginas que faltan
+    if checkpoint and complete:
+        checkpoint.listing_done(rows)
+    return rows, complete
+
+def _merge_rows(rows, more):
+    seen = set(r["listing_id"] for r in rows)
+    for r in more:
+        if r["listing_id"] not in seen:
+            rows.append(r); seen.add(r["listing_id"])
     return rows
 
 
-def update_tracker(outdir, items, today):
-    ensure_dir(outdir); ensure_dir(os.path.join(outdir,"media"))
+# ----------------------- Descarga de imágenes -----------------------
+
+def thumb_rel(rel, width, ext="jpg"):
+    """media/<id>.jpg -> media/thumbs/<id>_w<width>.<ext> (mismo esquema que sirve /media?w=)."""
+    stem = os.path.splitext(os.path.basename(rel))[0]
+    return f"media/thumbs/{stem}_w{int(width)}.{ext}"
+
+def make_thumbnails(outdir, rel, widths=(320,), webp=True, quality=80):
+    """Genera una sola vez las variantes de ancho fijo (JPEG y opcionalmente WebP). Requiere Pillow."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    src = os.path.join(outdir, rel)
+    todo = [(w, ext) for w in widths for ext in (("jpg","webp") if webp else ("jpg",))
+            if not os.path.exists(os.path.join(outdir, thumb_rel(rel, w, ext)))]
+    if not todo:
+        return []
+    ensure_dir(os.path.join(outdir, "media", "thumbs"))
+    made = []
+    try:
+        with Image.open(src) as im:
+            im = im.convert("RGB")
+            for w, ext in todo:
+                t = im.copy()
+                if t.width > w:
+                    t = t.resize((w, max(1, round(t.height * w / t.width))), Image.LANCZOS)
+                dst = os.path.join(outdir, thumb_rel(rel, w, ext))
+                t.save(dst + ".part", "WEBP" if ext == "webp" else "JPEG", quality=quality, optimize=True)
+                os.replace(dst + ".part", dst)
+                made.append(dst)
+    except Exception:
+        pass
+    return made
+
+class ImageFetcher:
+    """Descarga de miniaturas en segundo plano; solo se rebaja una foto si cambia su URL y se reescribe si cambia su hash."""
+    def __init__(self, outdir, workers=8, per_host=4, session=None, thumb_widths=(320,), thumb_webp=True,
+                 metrics=None):
+        self.outdir = outdir
+        self.metrics = metrics or RunMetrics()
+        self.thumbs = (tuple(thumb_widths or ()), thumb_webp)
+        self.media = ensure_dir(os.path.join(outdir, "media"))
+        self.session = session or make_session(pool=workers)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="img")
+        self.per_host = per_host
+        self.hosts, self.lock = {}, threading.Lock()
+        self.futures, self.done = {}, {}
+        self.hash_path = os.path.join(self.media, "hashes.json")
+        try:
+            with open(self.hash_path, "r", encoding="utf-8") as f: self.hashes = json.load(f)
+        except Exception:
+            self.hashes = {}
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self.hosts[host]
+
+    def submit(self, lid, url):
+        if not url or not url.startswith("http") or lid in self.futures or lid in self.done:
+            return
+        rel = f"media/{lid}.jpg"
+        if os.path.exists(os.path.join(self.outdir, rel)) and self._known(lid, url).get("url") == url:
+            self.done[lid] = rel
+            if self.thumbs[0]:
+                self.pool.submit(make_thumbnails, self.outdir, rel, *self.thumbs)
+            return
+        self.futures[lid] = self.pool.submit(self._fetch, lid, url, rel)
+
+    def _known(self, lid, url):
+        """{url, sha1} guardado de la foto; el formato anterior (solo hash) se adopta con la URL actual."""
+        with self.lock:
+            known = self.hashes.get(lid)
+            if not isinstance(known, dict):
+                known = self.hashes[lid] = {"url": url, "sha1": known}
+            return known
+
+    def _fetch(self, lid, url, rel):
+        m = self.metrics
+        try:
+            with self._host_slot(url), m.timer("image_download"):
+                r = self.session.get(url, timeout=20)
+            m.inc("retries", count_retries(r))
+        except requests.RequestException:
+            m.inc("image_failures")
+            return None
+        if r.status_code != 200 or len(r.content) <= 128 or not r.headers.get("Content-Type", "image/").startswith("image/"):
+            m.inc("image_failures")
+            return None
+        m.inc("images")
+        digest = hashlib.sha1(r.content).hexdigest()
+        dst = os.path.join(self.outdir, rel)
+        same = self._known(lid, url).get("sha1") == digest and os.path.exists(dst)
+        with self.lock:
+            self.hashes[lid] = {"url": url, "sha1": digest}
+        if same:
+            m.inc("images_unchanged")
+        else:
+            # Foto nueva para un anuncio que ya tenía: sus variantes antiguas ya no valen
+            for w in self.thumbs[0]:
+                for ext in ("jpg", "webp"):
+                    try:
+                        os.remove(os.path.join(self.outdir, thumb_rel(rel, w, ext)))
+                    except OSError:
+                        pass
+            tmp = dst + ".part"
+            with open(tmp, "wb") as f: f.write(r.content)
+            os.replace(tmp, dst)
+        if self.thumbs[0]:
+            with m.timer("thumbnails"):
+                make_thumbnails(self.outdir, rel, *self.thumbs)
+        return rel
+
+    def wait(self):
+        for lid, fut in self.futures.items():
+            try:
+                rel = fut.result()
+            except Exception:
+                rel = None
+            if rel:
+                self.done[lid] = rel
+        self.futures = {}
+        self.pool.shutdown(wait=True)
+        with open(self.hash_path, "w", encoding="utf-8") as f: json.dump(self.hashes, f)
+        return dict(self.done)
+
+
+def load_tracker(outdir):
     tracker_path = os.path.join(outdir,"tracker_master.json")
     if os.path.exists(tracker_path):
-        with open(tracker_path,"r",encoding="utf-8") as f: tracker=json.load(f)
-    else:
-        tracker={}
+        with open(tracker_path,"r",encoding="utf-8") as f: return json.load(f)
+    return {}
+
+def card_signature(it):
+    """Lo que muestra la tarjeta del listado: si no cambia, la ficha tampoco hace falta reabrirla."""
+    return {"price": it.get("price"), "km": it.get("km"), "title": it.get("version","")}
+
+def select_for_enrichment(items, tracker, today, reverify_days=7):
+    """Items que hay que abrir (nuevos, cambiados o sin verificar en `reverify_days`); al resto les copia el tracker."""
+    todo = []
+    d_today = datetime.fromisoformat(today).date()
+    for it in items:
+        it["card_sig"] = card_signature(it)
+        node = tracker.get(it.get("listing_id"))
+        if node is None or node.get("card_sig") != it["card_sig"] or not node.get("last_enriched"):
+            todo.append(it); continue
+        try:
+            age = (d_today - datetime.fromisoformat(node["last_enriched"]).date()).days
+        except Exception:
+            age = None
+        if age is None or (reverify_days and age >= int(reverify_days)):
+            todo.append(it); continue
+        for k in ("year","km","fuel","gearbox","vat_note","desc_excerpt"):
+            if node.get(k) not in (None,""):
+                it[k] = node[k]
+        if node.get("last_price") is not None:
+            it["price"] = node["last_price"]
+        it["enriched_on"] = node["last_enriched"]
+    return todo
+
+# ----------------------- Tracker en SQLite (log de eventos) -----------------------
+
+NODE_COLS = ["listing_id","first_seen","last_seen","removed_on","status","brand","model","version",
+             "year","km","fuel","gearbox","vat_note","link","category","image_file","desc_excerpt",
+             "last_price","price_first_seen","price_last_change","price_changes_count","card_sig","last_enriched",
+             "dealer","price_history_json"]
+
+class TrackerStore:
+    """Tracker en SQLite: logs append-only (events, sightings, price_history) y estado materializado en `listings`."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS listings(
+        listing_id TEXT PRIMARY KEY, first_seen TEXT, last_seen TEXT, removed_on TEXT DEFAULT '',
+        status TEXT, brand TEXT, model TEXT, version TEXT, year INTEGER, km INTEGER, fuel TEXT,
+        gearbox TEXT, vat_note TEXT, link TEXT, category TEXT, image_file TEXT DEFAULT '',
+        desc_excerpt TEXT DEFAULT '', last_price REAL, price_first_seen TEXT, price_last_change TEXT,
+        price_changes_count INTEGER DEFAULT 0, card_sig TEXT, last_enriched TEXT DEFAULT '',
+        dealer TEXT DEFAULT '', price_history_json TEXT DEFAULT '[]');
+    CREATE INDEX IF NOT EXISTS ix_listings_status ON listings(status);
+    CREATE TABLE IF NOT EXISTS events(
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, listing_id TEXT, kind TEXT,
+        old_price REAL, new_price REAL);
+    CREATE INDEX IF NOT EXISTS ix_events_date ON events(date);
+    CREATE TABLE IF NOT EXISTS sightings(date TEXT, listing_id TEXT, PRIMARY KEY(date, listing_id));
+    CREATE TABLE IF NOT EXISTS price_history(listing_id TEXT, date TEXT, price REAL);
+    CREATE INDEX IF NOT EXISTS ix_ph_listing ON price_history(listing_id);
+    """
+
+    def __init__(self, outdir):
+        self.path = os.path.join(ensure_dir(outdir), "tracker.sqlite")
+        # TrackerWriter aplica lotes desde el hilo del navegador y cierra desde el principal
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(self.SCHEMA)
+        cols = [r[1] for r in self.db.execute("PRAGMA table_info(listings)")]
+        if "dealer" not in cols:
+            self.db.execute("ALTER TABLE listings ADD COLUMN dealer TEXT DEFAULT ''")
+        if "price_history_json" not in cols:
+            self._add_history_column()
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_listings_dealer ON listings(dealer, status)")
+        self._import_json(outdir)
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+    def close(self): self.db.close()
+
+    def _add_history_column(self):
+        """Migración única: materializa en listings el historial de precios de price_history."""
+        hist = {}
+        for lid, d, pr in self.db.execute("SELECT listing_id, date, price FROM price_history ORDER BY rowid"):
+            hist.setdefault(lid, []).append({"date": d, "price": pr})
+        with self.db:
+            self.db.execute("ALTER TABLE listings ADD COLUMN price_history_json TEXT DEFAULT '[]'")
+            self.db.executemany("UPDATE listings SET price_history_json=? WHERE listing_id=?",
+                                [(json.dumps(h, ensure_ascii=False), lid) for lid, h in hist.items()])
+
+    def _import_json(self, outdir):
+        """Migración única desde tracker_master.json si la base está vacía."""
+        if self.db.execute("SELECT 1 FROM listings LIMIT 1").fetchone():
+            return
+        tracker = load_tracker(outdir)
+        if not tracker:
+            return
+        with self.db:
+            for v in tracker.values():
+                self._insert(v)
+                self.db.executemany("INSERT INTO price_history VALUES (?,?,?)",
+                                    [(v["listing_id"], h.get("date"), h.get("price")) for h in v.get("price_history", [])])
+        print(f"[TRACKER] Migrados {len(tracker)} anuncios de tracker_master.json a {self.path}")
+
+    def _insert(self, node):
+        row = [node.get(c) for c in NODE_COLS]
+        row[NODE_COLS.index("card_sig")] = json.dumps(node.get("card_sig")) if node.get("card_sig") else None
+        row[NODE_COLS.index("price_history_json")] = json.dumps(node.get("price_history", []), ensure_ascii=False)
+        self.db.execute(f"INSERT OR REPLACE INTO listings({','.join(NODE_COLS)}) VALUES ({','.join('?'*len(NODE_COLS))})", row)
+
+    def get_nodes(self, ids):
+        """{listing_id: nodo} solo para los ids pedidos (para comparar tarjetas sin cargar todo)."""
+        out, ids = {}, list(ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i+500]
+            q = f"SELECT * FROM listings WHERE listing_id IN ({','.join('?'*len(chunk))})"
+            for r in self.db.execute(q, chunk):
+                d = dict(r)
+                d["card_sig"] = json.loads(d["card_sig"]) if d.get("card_sig") else None
+                out[d["listing_id"]] = d
+        return out
+
+    def apply_run(self, items, today, images=None, dealers=None, default_dealer=""):
+        """Aplica los items del día y cierra el día; devuelve los eventos de precio del día."""
+        items = list({it["listing_id"]: it for it in items if it.get("listing_id")}.values())
+        self.apply_items(items, today, images, default_dealer)
+        self.finalize(set(it["listing_id"] for it in items), today, images, dealers, default_dealer)
+        return self.price_events(today)
+
+    def price_events(self, today):
+        """Cambios de precio del día según el log `events` (incluye los de lotes de una ejecución caída)."""
+        q = """SELECT e.date, e.listing_id, TRIM(COALESCE(l.brand,'')||' '||COALESCE(l.model,'')||' '||COALESCE(l.version,''))
+                      AS title, e.old_price, e.new_price
+               FROM events e LEFT JOIN listings l ON l.listing_id = e.listing_id
+               WHERE e.kind='price' AND e.date=? ORDER BY e.id"""
+        return [{"date": r["date"], "listing_id": r["listing_id"], "title": r["title"],
+                 "old_price": float(r["old_price"]), "new_price": float(r["new_price"]),
+                 "delta": float(r["new_price"] - r["old_price"]),
+                 "pct": float((r["new_price"] - r["old_price"]) / r["old_price"]) if r["old_price"] else None}
+                for r in self.db.execute(q, (today,))]
+
+    def apply_items(self, items, today, images=None, default_dealer=""):
+        """Altas, precios, reapariciones y avistamientos de un lote (idempotente en el día, sin bajas)."""
+        images = images or {}
+        nodes = self.get_nodes(it["listing_id"] for it in items)
+        price_events = []
+        with self.db:
+            for it in items:
+                lid = it["listing_id"]; node = nodes.get(lid)
+                title = f"{it.get('brand','')} {it.get('model','')} {it.get('version','')}".strip()
+                imgfile = images.get(lid, "")
+                if not imgfile and os.path.exists(os.path.join(os.path.dirname(self.path), f"media/{lid}.jpg")):
+                    imgfile = f"media/{lid}.jpg"
+                self.db.execute("INSERT OR IGNORE INTO sightings VALUES (?,?)", (today, lid))
+                if node is None:
+                    self._insert({
+                        "listing_id": lid, "first_seen": today, "last_seen": today, "removed_on": "",
+                        "status": "active", "brand": it["brand"], "model": it["model"], "version": it["version"],
+                        "year": it["year"], "km": it["km"], "fuel": it["fuel"], "gearbox": it["gearbox"],
+                        "vat_note": it["vat_note"], "link": it["link"], "category": it["category"],
+                        "image_file": imgfile, "desc_excerpt": "", "last_price": it["price"],
+                        "price_first_seen": today, "price_last_change": today, "price_changes_count": 0,
+                        "card_sig": it.get("card_sig"), "last_enriched": it.get("enriched_on",""),
+                        "dealer": it.get("dealer") or default_dealer,
+                        "price_history": [{"date": today, "price": it["price"]}],
+                    })
+                    self.db.execute("INSERT INTO price_history VALUES (?,?,?)", (lid, today, it["price"]))
+                    self.db.execute("INSERT INTO events(date,listing_id,kind,new_price) VALUES (?,?,?,?)",
+                                    (today, lid, "new", it["price"]))
+                    continue
+                if node.get("status") != "active":
+                    self.db.execute("INSERT INTO events(date,listing_id,kind) VALUES (?,?,?)", (today, lid, "back"))
+                upd = {
+                    "last_seen": today, "status": "active", "removed_on": "",
+                    **{k: it.get(k) or node.get(k) for k in ("brand","model","version","year","km","fuel",
+                                                             "gearbox","vat_note","link","category")},
+                }
+                if it.get("dealer"): upd["dealer"] = it["dealer"]
+                if it.get("card_sig"): upd["card_sig"] = json.dumps(it["card_sig"])
+                if it.get("enriched_on"): upd["last_enriched"] = it["enriched_on"]
+                if imgfile and not node.get("image_file"): upd["image_file"] = imgfile
+                old = node.get("last_price"); new = it.get("price", old)
+                if new is not None and old is not None and abs(float(new)-float(old))>0.5:
+                    upd["price_last_change"] = today
+                    upd["price_changes_count"] = int(node.get("price_changes_count") or 0)+1
+                    upd["price_history_json"] = json.dumps(json.loads(node.get("price_history_json") or "[]")
+                                                           + [{"date": today, "price": new}], ensure_ascii=False)
+                    self.db.execute("INSERT INTO price_history VALUES (?,?,?)", (lid, today, new))
+                    self.db.execute("INSERT INTO events(date,listing_id,kind,old_price,new_price) VALUES (?,?,?,?,?)",
+                                    (today, lid, "price", old, new))
+                    price_events.append({
+                        "date": today, "listing_id": lid, "title": title,
+                        "old_price": float(old), "new_price": float(new),
+                        "delta": float(new-old),
+                        "pct": float((new-old)/old) if old else None
+                    })
+                upd["last_price"] = new
+                self.db.execute(f"UPDATE listings SET {', '.join(k+'=?' for k in upd)} WHERE listing_id=?",
+                                [*upd.values(), lid])
+        return price_events
+
+    def finalize(self, seen, today, images=None, dealers=None, default_dealer=""):
+        """Cierre del día: concesionario por defecto, fotos tardías y bajas de los activos no vistos."""
+        with self.db:
+            if default_dealer:
+                self.db.execute("UPDATE listings SET dealer=? WHERE dealer IS NULL OR dealer=''", (default_dealer,))
+            self.db.executemany("UPDATE listings SET image_file=? WHERE listing_id=? AND COALESCE(image_file,'')=''",
+                                [(rel, lid) for lid, rel in (images or {}).items() if lid in seen])
+            q, args = "SELECT listing_id FROM listings WHERE status='active'", []
+            if dealers is not None:
+                dealers = list(dealers)
+                q += f" AND dealer IN ({','.join('?'*len(dealers))})"; args = dealers
+            gone = [r[0] for r in self.db.execute(q, args) if r[0] not in seen]
+            self.db.executemany("UPDATE listings SET status='removed', removed_on=? WHERE listing_id=?",
+                                [(today, lid) for lid in gone])
+            self.db.executemany("INSERT INTO events(date,listing_id,kind) VALUES (?,?,?)",
+                                [(today, lid, "removed") for lid in gone])
+
+    def flat_rows(self, today):
+        """Filas del CSV master leídas tal cual de listings (solo days_active se calcula, en SQL)."""
+        q = """SELECT listing_id, first_seen, last_seen, removed_on,
+                  COALESCE(CAST(julianday(COALESCE(NULLIF(removed_on,''), ?)) - julianday(first_seen) AS INTEGER), 0)
+                  AS days_active, status, brand, model, version, year, km, fuel, gearbox, vat_note, link, category,
+                  COALESCE(dealer, '') AS dealer, image_file, desc_excerpt, last_price, price_first_seen,
+                  price_last_change, price_changes_count, COALESCE(price_history_json, '[]') AS price_history_json
+               FROM listings ORDER BY rowid"""
+        return [dict(r) for r in self.db.execute(q, (today,))]
+
+
+def update_tracker(outdir, items, today, images=None, backend="json", formats=("csv",), daily_csv=True,
+                   dealers=None, default_dealer=""):
+    """Actualiza el tracker con los items del día (bajas solo de `dealers`, si se indica) y escribe las salidas."""
+    ensure_dir(outdir); ensure_dir(os.path.join(outdir,"media"))
+    images = images or {}
+    if backend == "sqlite":
+        with TrackerStore(outdir) as store:
+            events = store.apply_run(items, today, images, dealers, default_dealer)
+            flat = store.flat_rows(today)
+        return write_outputs(outdir, flat, events, today, items, formats, daily_csv)
+    tracker_path = os.path.join(outdir,"tracker_master.json")
+    tracker = load_tracker(outdir)
+    if default_dealer:
+        for node in tracker.values():
+            if not node.get("dealer"): node["dealer"] = default_dealer
 
     seen_today = set(i["listing_id"] for i in items if i.get("listing_id"))
     events=[]
@@ -416,16 +1788,9 @@ def update_tracker(outdir, items, today):
     for it in items:
         lid = it["listing_id"]; title = f"{it.get('brand','')} {it.get('model','')} {it.get('version','')}".strip()
         node = tracker.get(lid)
-        imgfile = ""
-        if it.get("image"):
+        imgfile = images.get(lid, "")
+        if not imgfile and os.path.exists(os.path.join(outdir, f"media/{lid}.jpg")):
             imgfile = f"media/{lid}.jpg"
-            dst = os.path.join(outdir, imgfile)
-            if not os.path.exists(dst):
-                try:
-                    r=requests.get(it["image"], timeout=20)
-                    if r.status_code==200 and len(r.content)>128:
-                        with open(dst,"wb") as f: f.write(r.content)
-                except: pass
 
         if node is None:
             tracker[lid] = {
@@ -436,7 +1801,9 @@ def update_tracker(outdir, items, today):
                 "vat_note": it["vat_note"], "link": it["link"], "category": it["category"],
                 "image_file": imgfile, "desc_excerpt":"", "last_price": it["price"],
                 "price_first_seen": today, "price_last_change": today, "price_changes_count": 0,
-                "price_history":[{"date":today,"price":it["price"]}]
+                "price_history":[{"date":today,"price":it["price"]}],
+                "card_sig": it.get("card_sig"), "last_enriched": it.get("enriched_on",""),
+                "dealer": it.get("dealer") or default_dealer
             }
         else:
             old = node.get("last_price")
@@ -454,6 +1821,9 @@ def update_tracker(outdir, items, today):
                 "link": it["link"] or node.get("link",""),
                 "category": it["category"] or node.get("category",""),
             })
+            if it.get("dealer"): node["dealer"]=it["dealer"]
+            if it.get("card_sig"): node["card_sig"]=it["card_sig"]
+            if it.get("enriched_on"): node["last_enriched"]=it["enriched_on"]
             if imgfile and not node.get("image_file"): node["image_file"]=imgfile
             if new is not None and old is not None and abs(float(new)-float(old))>0.5:
                 node["price_history"].append({"date":today,"price":new})
@@ -467,8 +1837,9 @@ def update_tracker(outdir, items, today):
                 })
             node["last_price"]=new
 
+    dealers = set(dealers) if dealers is not None else None
     for lid, node in tracker.items():
-        if node.get("status")=="active" and lid not in seen_today:
+        if node.get("status")=="active" and lid not in seen_today and (dealers is None or node.get("dealer") in dealers):
             node["status"]="removed"; node["removed_on"]=today
 
     for node in tracker.values():
@@ -481,47 +1852,529 @@ def update_tracker(outdir, items, today):
 
     with open(tracker_path,"w",encoding="utf-8") as f: json.dump(tracker,f,ensure_ascii=False,indent=2)
 
-    flat=[]
-    for v in tracker.values():
-        flat.append({
+    flat=[flat_node(v) for v in tracker.values()]
+    return write_outputs(outdir, flat, events, today, items, formats, daily_csv)
+
+class TrackerWriter:
+    """Tracker escrito por lotes de `batch` items a medida que el pipeline los termina; finish() cierra el día."""
+    def __init__(self, outdir, today, backend="json", batch=200, default_dealer="", metrics=None):
+        self.outdir, self.today, self.backend = outdir, today, backend
+        self.batch, self.default_dealer = max(1, int(batch or 1)), default_dealer
+        self.m = metrics or RunMetrics()
+        self.items, self.seen, self.pending = [], set(), []
+        self.lock = threading.Lock()
+        self.store = TrackerStore(outdir) if backend == "sqlite" else None
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+    def close(self):
+        if self.store:
+            self.store.close()
+
+    def add(self, *items):
+        """Items terminados (el primero de cada listing_id gana); aplica el lote si está lleno."""
+        with self.lock:
+            for it in items:
+                lid = it.get("listing_id")
+                if not lid or lid in self.seen:
+                    continue
+                self.seen.add(lid); self.items.append(it); self.pending.append(it)
+            if self.store and len(self.pending) >= self.batch:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        with self.m.timer("tracker_batch"):
+            self.store.apply_items(self.pending, self.today, default_dealer=self.default_dealer)
+        self.m.inc("tracker_batches")
+        self.pending = []
+
+    def finish(self, images=None, dealers=None, formats=("csv",), daily_csv=True):
+        """Último lote, bajas (solo de `dealers`, si se indica) y salidas; mismo resultado que update_tracker."""
+        if not self.store:
+            return update_tracker(self.outdir, self.items, self.today, images, "json", formats, daily_csv,
+                                  dealers, self.default_dealer)
+        ensure_dir(os.path.join(self.outdir, "media"))
+        with self.lock:
+            self._flush()
+            self.store.finalize(self.seen, self.today, images, dealers, self.default_dealer)
+            flat = self.store.flat_rows(self.today)
+            # Del log y no de lo aplicado en esta ejecución: tras --resume los lotes ya escritos no repiten eventos
+            events = self.store.price_events(self.today)
+        return write_outputs(self.outdir, flat, events, self.today, self.items, formats, daily_csv)
+
+def flat_node(v):
+    """Nodo del tracker -> fila del CSV master."""
+    return {
             "listing_id": v["listing_id"], "first_seen": v["first_seen"], "last_seen": v["last_seen"],
             "removed_on": v["removed_on"], "days_active": v["days_active"], "status": v["status"],
             "brand": v.get("brand",""), "model": v.get("model",""), "version": v.get("version",""),
             "year": v.get("year"), "km": v.get("km"), "fuel": v.get("fuel",""), "gearbox": v.get("gearbox",""),
             "vat_note": v.get("vat_note",""), "link": v.get("link",""), "category": v.get("category",""),
+            "dealer": v.get("dealer") or "",
             "image_file": v.get("image_file",""), "desc_excerpt": v.get("desc_excerpt",""),
             "last_price": v.get("last_price"),
             "price_first_seen": v.get("price_first_seen"), "price_last_change": v.get("price_last_change"),
             "price_changes_count": v.get("price_changes_count",0),
             "price_history_json": json.dumps(v.get("price_history",[]), ensure_ascii=False)
-        })
+    }
+
+PRICE_EVENT_COLS = ["date","listing_id","title","old_price","new_price","delta","pct"]
 
+def write_outputs(outdir, flat, events, today, items, formats=("csv",), daily_csv=True):
+    """Escribe las salidas del día: "csv" (master, eventos y consolidado diario) y/o "parquet"."""
     df = pd.DataFrame(flat)
     master_csv = os.path.join(outdir, "lovecars_tracker_master.csv")
     today_csv  = os.path.join(outdir, f"lovecars_autoscout_consolidado_{today}.csv")
-    df.to_csv(master_csv, index=False, encoding="utf-8-sig")
-    df.to_csv(today_csv,  index=False, encoding="utf-8-sig")
-
     ev_path = os.path.join(outdir, f"lovecars_price_events_{today}.csv")
-    pd.DataFrame(events, columns=["date","listing_id","title","old_price","new_price","delta","pct"]).to_csv(ev_path, index=False, encoding="utf-8-sig")
+    out = {}
+    if "csv" in formats:
+        df.to_csv(master_csv, index=False, encoding="utf-8-sig")
+        if daily_csv:
+            df.to_csv(today_csv,  index=False, encoding="utf-8-sig")
+        pd.DataFrame(events, columns=PRICE_EVENT_COLS).to_csv(ev_path, index=False, encoding="utf-8-sig")
+    if "parquet" in formats:
+        out = write_parquet(outdir, flat, events, today)
 
     altas=[v for v in flat if v["first_seen"]==today]
     bajas=[v for v in flat if v["removed_on"]==today]
     activos=[v for v in flat if v["status"]=="active"]
 
     return {"items_collected":len(set(i["listing_id"] for i in items)),
-            "master_csv":master_csv, "consolidated_csv":today_csv, "price_events_csv":ev_path,
+            "master_csv":master_csv if "csv" in formats else "",
+            "consolidated_csv":today_csv if ("csv" in formats and daily_csv) else "",
+            "price_events_csv":ev_path if "csv" in formats else "",
+            **out,
             "counts":{"activos":len(activos),"altas":len(altas),"bajas":len(bajas),"price_events":len(events)}}
 
-def run_once(config_path):
+def _as_date(v):
+    try:
+        return date.fromisoformat(str(v)[:10]) if v else None
+    except ValueError:
+        return None
+
+def _as_int(v):
+    try:
+        return int(float(v)) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+def _as_float(v):
+    try:
+        return float(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+def master_schema(pa):
+    """Esquema tipado del master (enteros para km/año, float para precio, fechas como date32)."""
+    txt, d = pa.string(), pa.date32()
+    return pa.schema([
+        ("listing_id", txt), ("first_seen", d), ("last_seen", d), ("removed_on", d),
+        ("days_active", pa.int32()), ("status", txt), ("brand", txt), ("model", txt), ("version", txt),
+        ("year", pa.int16()), ("km", pa.int32()), ("fuel", txt), ("gearbox", txt), ("vat_note", txt),
+        ("link", txt), ("category", txt), ("dealer", txt), ("image_file", txt), ("desc_excerpt", txt),
+        ("last_price", pa.float64()), ("price_first_seen", d), ("price_last_change", d),
+        ("price_changes_count", pa.int32()),
+    ])
+
+CONVERT = {"date32[day]": _as_date, "int16": _as_int, "int32": _as_int, "double": _as_float}
+
+def write_parquet(outdir, flat, events, today):
+    """Salida columnar (requiere pyarrow): master tipado, price_history y snapshots/eventos particionados por fecha."""
+    try:
+        import pyarrow as pa, pyarrow.parquet as pq
+    except ImportError:
+        print("[PARQUET] pyarrow no está instalado: se omite la salida parquet")
+        return {}
+    schema = master_schema(pa)
+    cols = {}
+    for f in schema:
+        conv = CONVERT.get(str(f.type), lambda v: None if v is None else str(v))
+        cols[f.name] = [conv(r.get(f.name)) for r in flat]
+    master = pa.Table.from_pydict(cols, schema=schema)
+
+    hist = {"listing_id": [], "date": [], "price": []}
+    for r in flat:
+        for h in json.loads(r.get("price_history_json") or "[]"):
+            hist["listing_id"].append(r["listing_id"]); hist["date"].append(_as_date(h.get("date")))
+            hist["price"].append(_as_float(h.get("price")))
+    history = pa.Table.from_pydict(hist, schema=pa.schema([("listing_id", pa.string()), ("date", pa.date32()),
+                                                           ("price", pa.float64())]))
+    ev_schema = pa.schema([("date", pa.date32()), ("listing_id", pa.string()), ("title", pa.string()),
+                           ("old_price", pa.float64()), ("new_price", pa.float64()),
+                           ("delta", pa.float64()), ("pct", pa.float64())])
+    ev = pa.Table.from_pydict({f.name: [CONVERT.get(str(f.type), str)(e.get(f.name)) for e in events]
+                               for f in ev_schema}, schema=ev_schema)
+
+    paths = {
+        "master_parquet": os.path.join(outdir, "tracker_master.parquet"),
+        "price_history_parquet": os.path.join(outdir, "price_history.parquet"),
+        "snapshot_parquet": os.path.join(ensure_dir(os.path.join(outdir, "snapshots", f"date={today}")), "part-0.parquet"),
+        "price_events_parquet": os.path.join(ensure_dir(os.path.join(outdir, "price_events", f"date={today}")), "part-0.parquet"),
+    }
+    pq.write_table(master, paths["master_parquet"], compression="zstd")
+    pq.write_table(history, paths["price_history_parquet"], compression="zstd")
+    pq.write_table(master, paths["snapshot_parquet"], compression="zstd")
+    pq.write_table(ev, paths["price_events_parquet"], compression="zstd")
+    return paths
+
+# ----------------------- Checkpoints de ejecución -----------------------
+
+class RunCheckpoint:
+    """Estado de la ejecución del día (páginas, fichas, enriquecidos), reescrito de forma atómica para `--resume`."""
+    SAVE_EVERY = 2.0   # seg. mínimos entre guardados durante el enriquecimiento
+
+    def __init__(self, outdir, today, resume=False, name=None):
+        fname = f"run_{today}_{name}.json" if name else f"run_{today}.json"
+        self.path = os.path.join(ensure_dir(os.path.join(outdir, "run_state")), fname)
+        self.state = {"today": today, "stage": "listing", "visited": [], "last_page": None,
+                      "cards": [], "enriched": []}
+        if resume and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f: self.state.update(json.load(f))
+            print(f"[RESUME] {self.path}: etapa {self.stage}, {len(self.visited)} páginas, "
+                  f"{len(self.cards)} fichas, {len(self.state['enriched'])} enriquecidas")
+        self.enriched = set(self.state["enriched"])
+        self._saved_at = 0.0
+        self.lock = threading.RLock()
+
+    stage = property(lambda self: self.state["stage"])
+    visited = property(lambda self: set(self.state["visited"]))
+    last_page = property(lambda self: self.state["last_page"])
+    cards = property(lambda self: self.state["cards"])
+
+    def save(self, force=True):
+        if not force and time.monotonic() - self._saved_at < self.SAVE_EVERY:
+            return
+        with self.lock:
+            self.state["enriched"] = sorted(self.enriched)
+            tmp = self.path + ".part"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(self.state, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._saved_at = time.monotonic()
+
+    def page_done(self, n, new_rows, last_page=None):
+        with self.lock:
+            if n not in self.state["visited"]:
+                self.state["visited"].append(n)
+            self.state["cards"].extend(new_rows)
+            self.state["last_page"] = last_page or self.state["last_page"]
+            self.save()
+
+    def listing_done(self, rows):
+        self.state["cards"] = rows      # mismos dicts que se enriquecen después
+        self.state["stage"] = "enrich"
+        self.save()
+
+    def item_done(self, it):
+        with self.lock:
+            self.enriched.add(it["listing_id"])
+        self.save(force=False)
+
+    def pending(self, items):
+        return [it for it in items if it["listing_id"] not in self.enriched]
+
+    def set_stage(self, stage):
+        self.state["stage"] = stage
+        self.save()
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# ----------------------- Bundles para la web estática -----------------------
+
+BUNDLE_CARD_COLS = ["listing_id","brand","model","version","year","km","last_price","link",
+                    "first_seen","last_seen","removed_on","image_file","category"]
+BUNDLE_ACTIVE_COLS = ["listing_id","brand","model","version","year","km","fuel","gearbox",
+                      "last_price","category","status","first_seen","last_seen","removed_on","link","image_file"]
+
+def _write_bundle(bdir, name, obj):
+    """JSON compacto con el hash del contenido en el nombre (cacheable para siempre)."""
+    raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    fname = f"{name}.{hashlib.sha1(raw).hexdigest()[:10]}.json"
+    with open(os.path.join(bdir, fname), "wb") as f: f.write(raw)
+    return f"bundles/{fname}"
+
+def _columnar(df, cols):
+    cols = [c for c in cols if c in df.columns]
+    return {"cols": cols, "rows": df[cols].values.tolist()}
+
+def build_site_bundles(outdir, today=None, days=30):
+    """Precalcula los bundles (con hash en el nombre) que pinta site/index.html; devuelve el bloque del manifest."""
+    today = today or date.today().isoformat()
+    bdir = ensure_dir(os.path.join(outdir, "bundles"))
+    mpath = os.path.join(outdir, "lovecars_tracker_master.csv")
+    df = pd.read_csv(mpath, dtype=str).fillna("") if os.path.exists(mpath) else pd.DataFrame(columns=BUNDLE_ACTIVE_COLS)
+    for c in BUNDLE_ACTIVE_COLS:
+        if c not in df.columns: df[c] = ""
+
+    by_first = df.groupby("first_seen").indices
+    by_removed = df.groupby("removed_on").indices
+    all_days = sorted(set(d for d in list(by_first) + list(by_removed) if d), reverse=True)[:days]
+    shards, per_day = {}, []
+    for d in all_days:
+        altas = df.iloc[by_first.get(d, [])]; bajas = df.iloc[by_removed.get(d, [])]
+        shards[d] = _write_bundle(bdir, f"day-{d}", {"date": d, "altas": _columnar(altas, BUNDLE_CARD_COLS),
+                                                     "bajas": _columnar(bajas, BUNDLE_CARD_COLS)})
+        per_day.append({"date": d, "altas": len(altas), "bajas": len(bajas)})
+
+    active = df[df["status"] == "active"]
+    ev_path = os.path.join(outdir, f"lovecars_price_events_{today}.csv")
+    ev = pd.read_csv(ev_path, dtype=str).fillna("") if os.path.exists(ev_path) else pd.DataFrame(columns=PRICE_EVENT_COLS)
+    out = {
+        "summary": _write_bundle(bdir, "summary", {
+            "today": today,
+            "counts": {"activos": len(active), "altas": len(by_first.get(today, [])),
+                       "bajas": len(by_removed.get(today, [])), "price_events": len(ev)},
+            "days": per_day}),
+        "active": _write_bundle(bdir, "active", _columnar(active, BUNDLE_ACTIVE_COLS)),
+        "price_events": _write_bundle(bdir, "price_events", _columnar(ev, PRICE_EVENT_COLS)),
+        "days": shards,
+    }
+    keep = set(os.path.basename(p) for p in [out["summary"], out["active"], out["price_events"], *shards.values()])
+    for f in os.listdir(bdir):
+        if f.endswith(".json") and f not in keep:
+            os.remove(os.path.join(bdir, f))
+    return out
+
+
+# ----------------------- Varios concesionarios -----------------------
+
+def dealer_slug(url):
+    """https://…/profesionales/love-cars -> "love-cars" (clave del concesionario en el tracker)."""
+    parts = [p for p in urlparse(url).path.split("/") if p]
+    return parts[-1] if parts else urlparse(url).netloc
+
+def dealer_sources(cfg):
+    """`start_urls` (URL o {url, dealer}) o, si no hay, `start_url` -> [{"url", "dealer"}]."""
+    out, seen = [], set()
+    for s in cfg.get("start_urls") or [cfg.get("start_url")]:
+        src = {"url": s} if isinstance(s, str) else dict(s)
+        src["dealer"] = src.get("dealer") or dealer_slug(src["url"])
+        if src["dealer"] not in seen:
+            out.append(src); seen.add(src["dealer"])
+    return out
+
+def dealer_cfg(cfg, src, n_workers):
+    """Config de un worker: su start_url y su parte del presupuesto global (ritmo y fichas en paralelo)."""
+    c = dict(cfg, start_url=src["url"])
+    for k in ("max_requests_per_second", "start_requests_per_second", "min_requests_per_second"):
+        if cfg.get(k):
+            c[k] = float(cfg[k]) / n_workers
+    delay = float(cfg.get("delay_seconds", 1.2))
+    if not cfg.get("max_requests_per_second") and delay > 0:
+        # sin techo configurado: el ritmo fijo de delay_seconds, también repartido
+        c.update(max_requests_per_second=1.0 / delay / n_workers, adaptive_rate=False)
+    c["detail_concurrency"] = max(1, int(cfg.get("detail_concurrency", 4)) // n_workers)
+    return c
+
+async def _stream_dealer(session, cfg, dealer, today, ckpt, limiter, m, cache=None, known=None,
+                         on_listing=None, on_item=None):
+    """Pipeline en streaming de un concesionario (listado -> cola acotada -> páginas de fichas); devuelve (fichas, completo)."""
+    ddelay = float(cfg.get("detail_delay_seconds", cfg.get("delay_seconds", 1.2)))
+    waits = PageWaits.from_cfg(cfg, ddelay, m)
+    size = max(1, int(cfg.get("stream_queue_size", 100)))
+    queue = asyncio.Queue(maxsize=size)
+    items, seen, broken = [], set(), []
+    stats = {"queued": 0, "cache": 0, "direct": 0, "peak": 0}
+
+    async def feed(rows):
+        new = [r for r in rows if r.get("listing_id") and r["listing_id"] not in seen]
+        if not new:
+            return
+        for it in new:
+            seen.add(it["listing_id"]); it["dealer"] = dealer
+        items.extend(new)
+        if on_listing:
+            on_listing(new)
+        todo = new
+        if cfg.get("incremental_enrichment", True) and known:
+            todo = select_for_enrichment(new, known(it["listing_id"] for it in new), today, cfg.get("reverify_days",7))
+        todo = set(it["listing_id"] for it in ckpt.pending(todo))
+        for it in new:
+            if it["listing_id"] not in todo:
+                stats["direct"] += 1
+            elif _enrich_cached(it, cache, m, ckpt.lock):
+                stats["cache"] += 1; ckpt.item_done(it)
+            else:
+                stats["queued"] += 1
+                await queue.put(it)
+                stats["peak"] = max(stats["peak"], queue.qsize())
+                continue
+            if on_item:
+                on_item(it)
+
+    async def worker():
+        page = None
+        while True:
+            it = await queue.get()
+            if it is None:
+                break
+            if page is None and not broken:
+                try:
+                    page = await session.new_page()
+                except Exception as e:
+                    if not broken:
+                        m.inc("failures")
+                        print(f"[DETAIL] Sin navegador ({type(e).__name__}): las fichas siguen sin enriquecer")
+                    broken.append(e)
+            # Un fallo por ficha no puede parar al consumidor: con la cola llena el listado esperaría para siempre
+            try:
+                if page is not None and await _enrich_one(session, page, it, waits, limiter, cache, m, ckpt.lock):
+                    ckpt.item_done(it)
+            except Exception as e:
+                m.inc("failures")
+                print(f"[DETAIL] {it.get('listing_id')}: {type(e).__name__}: {e}")
+                # la página puede haber muerto: se abre otra para la siguiente ficha
+                with suppress(Exception):
+                    await page.close()
+                page = None
+            try:
+                # sin ficha, el anuncio sigue visto hoy (si no, finish() lo daría de baja)
+                if on_item:
+                    on_item(it)
+            except Exception as e:
+                m.inc("failures")
+                print(f"[DETAIL] {it.get('listing_id')}: {type(e).__name__}: {e}")
+        if page is not None:
+            await page.close()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, int(cfg.get("detail_concurrency", 4))))]
+    with m.timer("pipeline"):
+        try:
+            with m.timer("listing"):
+                rows, complete = await _listings_async(cfg, ckpt, m, limiter, session, feed)
+            await feed(rows)  # por si alguna fila no llegó página a página
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+    print(f"[STREAM] {dealer}: {len(items)} fichas · {stats['queued']} abiertas, {stats['cache']} de cache, "
+          f"{stats['direct']} sin cambios (cola máx. {stats['peak']}/{size}) · "
+          f"{m.gauges.get('requests_per_minute', 0)} pet./min, ritmo final {limiter.rate:.2f}/s")
+    return items, complete
+
+def crawl_dealer(cfg, src, today, resume=False, multi=False, on_listing=None, on_item=None, on_event=None):
+    """Listado + fichas de un concesionario; devuelve {"dealer", "items", "ok", "report"}."""
+    outdir = os.path.abspath(cfg.get("output_dir","./output"))
+    dealer, metrics = src["dealer"], RunMetrics(on_event)
+    ckpt = RunCheckpoint(outdir, today, resume=resume, name=dealer if multi else None)
+    # Un único presupuesto de cortesía (adaptativo) para todas las navegaciones (listado y fichas)
+    limiter = RateLimiter.from_cfg(cfg, metrics)
+    # Cada worker con su índice de cache (SQLite no admite bien escritores en paralelo)
+    croot = os.path.join(outdir, "cache", "detail", *([dealer] if multi else []))
+    cache = DetailCache(croot, cfg.get("detail_cache_ttl_hours",20),
+                        cfg.get("detail_cache_max_mb",200)) if cfg.get("detail_cache", True) else None
+    # Lo que ya sabe el tracker, para abrir solo fichas nuevas, cambiadas o caducadas
+    store = TrackerStore(outdir) if cfg.get("tracker_backend", "json") == "sqlite" else None
+    tracker = {} if store else load_tracker(outdir)
+    known = store.get_nodes if store else (lambda ids: {i: tracker[i] for i in ids if i in tracker})
+    try:
+        # Un solo navegador (y las cookies guardadas) para el listado y las fichas
+        with BrowserSession.from_cfg(cfg, outdir, metrics) as session:
+            items, complete = session.run(_stream_dealer(session, cfg, dealer, today, ckpt, limiter, metrics, cache,
+                                                         known, on_listing, on_item))
+    except Exception as e:
+        if not multi:
+            raise
+        metrics.inc("failures")
+        print(f"[DEALER] {dealer}: listado fallido ({e!r})")
+        return {"dealer": dealer, "items": [], "ok": False, "report": metrics.report()}
+    finally:
+        ckpt.save()
+        if cache:
+            cache.close()
+        if store:
+            store.close()
+    if not complete:
+        # Con páginas sin cargar no se sabe qué anuncios faltan de verdad: sin bajas para este concesionario
+        print(f"[DEALER] {dealer}: listado incompleto, sin bajas")
+        return {"dealer": dealer, "items": items, "ok": False, "report": metrics.report()}
+    ckpt.set_stage("tracker")
+    return {"dealer": dealer, "items": items, "ok": bool(items), "report": metrics.report()}
+
+def run_once(config_path, resume=False, on_event=None):
+    """Ejecución completa (reanudable con resume=True); varios `start_urls` se rastrean en procesos aparte."""
     cfg = read_cfg(config_path)
     outdir = os.path.abspath(cfg.get("output_dir","./output"))
-    delay = float(cfg.get("delay_seconds",1.2))
-    maxp  = int(cfg.get("max_pages",300))
-    items = collect_autoscout(cfg.get("start_url"), delay, maxp)
-    items = enrich_items_with_details(cfg.get("start_url"), items, delay)
     today = date.today().isoformat()
-    return update_tracker(outdir, items, today)
+    metrics = RunMetrics(on_event)
+    try:
+        res = _run_stages(cfg, outdir, today, resume, metrics)
+    except BaseException as e:
+        metrics.write(outdir, today, ok=False, error=repr(e))
+        raise
+    res["report"] = metrics.write(outdir, today, ok=True, counts=res.get("counts", {}), dealers=res["dealers"])
+    print(f"[METRICS] {json.dumps({k: v['seconds'] for k, v in res['report']['stages'].items()})} "
+          f"{json.dumps(res['report']['counters'])}")
+    return res
+
+def _run_stages(cfg, outdir, today, resume, metrics):
+    sources = dealer_sources(cfg)
+    multi = len(sources) > 1
+    # Las miniaturas se descargan en este proceso mientras los concesionarios siguen rastreándose
+    fetcher = ImageFetcher(outdir, int(cfg.get("image_workers",8)), int(cfg.get("image_per_host",4)),
+                           thumb_widths=cfg.get("thumb_widths",[320]), thumb_webp=cfg.get("thumb_webp",True),
+                           metrics=metrics)
+    def submit(rows):
+        for it in rows:
+            fetcher.submit(it["listing_id"], it.get("image"))
+    with TrackerWriter(outdir, today, cfg.get("tracker_backend", "json"), cfg.get("tracker_batch_size", 200),
+                       sources[0]["dealer"], metrics) as writer:
+        metrics.emit("stage", stage="crawl", dealers=[s["dealer"] for s in sources])
+        results = _crawl_all(cfg, sources, today, resume, metrics, submit, writer)
+        for r in results:
+            metrics.merge(r["report"])
+        metrics.emit("stage", stage="images")
+        with metrics.timer("image_wait"):
+            images = fetcher.wait()
+        metrics.emit("stage", stage="tracker")
+        metrics.progress()
+        with metrics.timer("tracker_write"):
+            res = writer.finish(images, dealers=[r["dealer"] for r in results if r["ok"]],
+                                formats=tuple(cfg.get("output_formats") or ("csv",)),
+                                daily_csv=bool(cfg.get("daily_csv", True)))
+    for r in results:
+        if r["ok"]:
+            RunCheckpoint(outdir, today, name=r["dealer"] if multi else None).clear()
+    res["dealers"] = {r["dealer"]: {"items": len(r["items"]), "ok": r["ok"]} for r in results}
+    return res
+
+def _crawl_all(cfg, sources, today, resume, metrics, submit, writer):
+    """Un concesionario en este proceso (fotos y tracker en streaming) o varios en procesos."""
+    results = []
+    with metrics.timer("crawl"):
+        if len(sources) == 1:
+            results.append(crawl_dealer(dealer_cfg(cfg, sources[0], 1), sources[0], today, resume,
+                                        on_listing=submit, on_item=writer.add, on_event=metrics.on_event))
+        else:
+            n = max(1, min(int(cfg.get("dealer_workers", 4)), len(sources)))
+            print(f"[DEALER] {len(sources)} concesionarios en {n} procesos")
+            with ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futs = {pool.submit(crawl_dealer, dealer_cfg(cfg, src, n), src, today, resume, True): src
+                        for src in sources}
+                for f in as_completed(futs):
+                    try:
+                        r = f.result()
+                    except Exception as e:
+                        r = {"dealer": futs[f]["dealer"], "items": [], "ok": False, "report": {}}
+                        print(f"[DEALER] {r['dealer']}: worker caído ({e!r})")
+                    results.append(r)
+                    submit(r["items"])
+                    writer.add(*r["items"])
+                    metrics.emit("dealer", dealer=r["dealer"], items=len(r["items"]), ok=r["ok"],
+                                 counters=(r["report"] or {}).get("counters", {}))
+                    print(f"[DEALER] {r['dealer']}: {len(r['items'])} fichas" + ("" if r["ok"] else " · FALLIDO (sin bajas)"))
+    return results
 
 if __name__=="__main__":
-    print(run_once(os.path.join(HERE,"config.yaml")))
+    import argparse
+    ap = argparse.ArgumentParser(description="Scraper LoveCars (AutoScout24)")
+    ap.add_argument("--config", default=os.path.join(HERE,"config.yaml"))
+    ap.add_argument("--resume", action="store_true", help="continúa la ejecución de hoy desde su checkpoint")
+    args = ap.parse_args()
+    print(json.dumps(run_once(args.config, resume=args.resume), ensure_ascii=False, indent=2, default=str))
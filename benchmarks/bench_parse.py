@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de parseo: parsers BeautifulSoup anteriores vs lxml/XPath actuales.
+Comprueba que la salida es idéntica y mide el tiempo por página.
+
+    python benchmarks/bench_parse.py [--repeat 50]
+"""
+import os, sys, time, argparse
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from bs4 import BeautifulSoup
+import autoscout_scraper as S
+from legacy_parsers import legacy_parse_card, legacy_parse_detail_html
+
+BASE = "https://www.autoscout24.es"
+
+def read_fixture(name):
+    with open(os.path.join(HERE, "fixtures", name), encoding="utf-8") as f:
+        return f.read()
+
+# ----- listado completo (modo "full") -----
+def legacy_listing(html):
+    cards = BeautifulSoup(html, "lxml").select(S.CARD_SELECTOR)
+    return [r for r in (legacy_parse_card(c, BASE) for c in cards) if r]
+
+def new_listing(html):
+    return [r for r in (S.parse_card(c, BASE) for c in S.CARD_XPATH(S.html_doc(html))) if r]
+
+# ----- fragmentos outerHTML (modo "incremental") -----
+def legacy_fragments(frags):
+    return [legacy_parse_card(BeautifulSoup(h, "lxml"), BASE) for h in frags]
+
+def new_fragments(frags):
+    return [S.parse_card(S.html_fragment(h), BASE) for h in frags]
+
+def timed(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de parsers (bs4 vs lxml)")
+    ap.add_argument("--repeat", type=int, default=30)
+    args = ap.parse_args()
+
+    listing = read_fixture("listing_page.html")
+    detail = read_fixture("detail_page.html")
+    frags = [S.lxml.html.tostring(c, encoding="unicode") for c in S.CARD_XPATH(S.html_doc(listing))]
+
+    cases = [("listado (full)", legacy_listing, new_listing, listing, len(listing)),
+             ("tarjetas (incremental)", legacy_fragments, new_fragments, frags, sum(map(len, frags))),
+             ("ficha", legacy_parse_detail_html, S.parse_detail_html, detail, len(detail))]
+
+    print(f"{'caso':<24}{'KB':>8}{'bs4 ms':>10}{'lxml ms':>10}{'x':>7}")
+    ok = True
+    for name, old_fn, new_fn, arg, size in cases:
+        old_out, t_old = timed(old_fn, arg, args.repeat)
+        new_out, t_new = timed(new_fn, arg, args.repeat)
+        same = old_out == new_out
+        ok &= same
+        print(f"{name:<24}{size/1024:>8.1f}{t_old*1000:>10.2f}{t_new*1000:>10.2f}{t_old/t_new:>7.1f}"
+              + ("" if same else "   ¡SALIDA DISTINTA!"))
+        if not same:
+            for a, b in zip(old_out if isinstance(old_out, list) else [old_out],
+                            new_out if isinstance(new_out, list) else [new_out]):
+                if a != b:
+                    print("   bs4 :", a)
+                    print("   lxml:", b)
+                    break
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline del pipeline: parseo, listado (HTTP y Playwright), fichas, listado+fichas
+en streaming, imágenes y tracker, contra el sitio local de fixtures y trackers sintéticos. Sin red externa.
+
+Por etapa: segundos, throughput, pico de memoria Python (tracemalloc) y RSS máximo.
+Con --baseline compara contra un informe anterior y sale con código 1 si alguna etapa
+es más lenta que la tolerancia (para correrlo antes de desplegar).
+
+    python benchmarks/bench_pipeline.py --pages 5 --tracker-sizes 1000,10000 --out bench.json
+    python benchmarks/bench_pipeline.py --baseline bench.json --tolerance 0.25
+"""
+import os, io, sys, json, time, shutil, argparse, tempfile, tracemalloc, contextlib
+from datetime import date
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import autoscout_scraper as S
+from fixture_site import FixtureSite
+from synth_tracker import synth_nodes, synth_items, write_tracker
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class Bench:
+    """Ejecuta etapas y acumula {etapa: {seconds, units, throughput, peak_mb, rss_mb}}."""
+
+    def __init__(self, mem=True, verbose=False):
+        self.mem, self.verbose, self.results = mem, verbose, {}
+
+    def stage(self, name, fn, unit="items"):
+        out = io.StringIO()
+        if self.mem:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(sys.stdout if self.verbose else out):
+                n = fn()
+        except Exception as e:
+            if self.mem:
+                tracemalloc.stop()
+            self.results[name] = {"skipped": f"{type(e).__name__}: {e}"[:120]}
+            print(f"{name:<28} omitida ({self.results[name]['skipped']})")
+            return None
+        secs = time.perf_counter() - t0
+        peak = None
+        if self.mem:
+            peak = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.stop()
+        r = {"seconds": round(secs, 4), "units": n, "unit": unit,
+             "throughput": round(n / secs, 1) if secs and n else None, "peak_mb": peak, "rss_mb": max_rss_mb()}
+        self.results[name] = r
+        print(f"{name:<28}{secs:>9.3f}s{n:>9} {unit:<8}{(r['throughput'] or 0):>10.1f}/s"
+              f"{(peak if peak is not None else float('nan')):>9.1f} MB{(r['rss_mb'] or 0):>9.1f} MB")
+        return r
+
+def browser_available():
+    try:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            p.chromium.launch(headless=True).close()
+        return True
+    except Exception as e:
+        print(f"(Playwright no disponible: {type(e).__name__}; se omiten las etapas con navegador)")
+        return False
+
+def compare(results, baseline_path, tolerance):
+    """Etapas más lentas que baseline*(1+tolerance) -> lista de (etapa, antes, ahora)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f).get("stages", {})
+    slow = []
+    for name, r in results.items():
+        b = base.get(name) or {}
+        if "seconds" in r and b.get("seconds") and r["seconds"] > b["seconds"] * (1 + tolerance):
+            slow.append((name, b["seconds"], r["seconds"]))
+    return slow
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark offline del pipeline del scraper")
+    ap.add_argument("--pages", type=int, default=5, help="páginas del listado local")
+    ap.add_argument("--detail-limit", type=int, default=24, help="fichas a abrir con Playwright")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--tracker-sizes", default="1000,10000", help="tamaños del tracker sintético (coma)")
+    ap.add_argument("--history", type=int, default=60, help="días de historial de precios por anuncio")
+    ap.add_argument("--backends", default="json,sqlite")
+    ap.add_argument("--no-browser", action="store_true")
+    ap.add_argument("--no-mem", action="store_true", help="sin tracemalloc (tiempos más limpios)")
+    ap.add_argument("--verbose", action="store_true", help="muestra la salida del scraper")
+    ap.add_argument("--out", help="guarda el informe JSON")
+    ap.add_argument("--baseline", help="informe JSON anterior para detectar regresiones")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    args = ap.parse_args()
+
+    bench = Bench(mem=not args.no_mem, verbose=args.verbose)
+    tmp = tempfile.mkdtemp(prefix="lovecars_bench_")
+    today = date.today().isoformat()
+    print(f"{'etapa':<28}{'tiempo':>10}{'n':>9} {'':<8}{'ritmo':>12}{'pico py':>12}{'RSS':>12}")
+    try:
+        with FixtureSite(pages=args.pages) as site:
+            pages = [site.listing(n) for n in range(1, args.pages + 1)]
+            detail = site.detail
+            state = {}
+
+            def parse_listing():
+                return sum(len(S.parse_listing_html(h, site.base)[0]) for h in pages)
+            bench.stage("parse/listing", parse_listing, "cards")
+
+            def parse_detail(n=50):
+                for _ in range(n):
+                    S.parse_detail_html(detail)
+                return n
+            bench.stage("parse/detail", parse_detail, "pages")
+
+            def listing_http():
+                state["rows"], ok = S.collect_http(site.start_url, 0, args.pages + 1)
+                return len(state["rows"])
+            bench.stage("listing/http", listing_http, "cards")
+
+            if not args.no_browser and browser_available():
+                for mode in ("incremental", "full"):
+                    bench.stage(f"listing/browser-{mode}",
+                                lambda m=mode: len(S.collect_autoscout(site.start_url, 0.05, args.pages + 1, m)),
+                                "cards")
+
+                def enrich():
+                    items = [dict(r) for r in state.get("rows", [])[:args.detail_limit]]
+                    S.enrich_items_with_details(site.start_url, items, 0.05, concurrency=args.concurrency)
+                    return sum(1 for it in items if it.get("enriched_on"))
+                bench.stage("enrich/browser", enrich, "details")
+
+                def stream():
+                    cfg = {"start_url": site.start_url, "output_dir": os.path.join(tmp, "stream"),
+                           "listing_mode": "http", "max_pages": args.pages + 1, "delay_seconds": 0.05,
+                           "detail_concurrency": args.concurrency, "detail_cache": False}
+                    r = S.crawl_dealer(cfg, {"url": site.start_url, "dealer": "bench"}, today)
+                    return len(r["items"])
+                bench.stage("pipeline/stream", stream, "cards")
+
+            def images():
+                f = S.ImageFetcher(os.path.join(tmp, "img"), workers=8, per_host=4)
+                for r in state.get("rows", []):
+                    f.submit(r["listing_id"], r.get("image"))
+                return len(f.wait())
+            bench.stage("images/fetch+thumbs", images, "images")
+
+        for n in [int(x) for x in args.tracker_sizes.split(",") if x.strip()]:
+            nodes = synth_nodes(n, args.history, today)
+            items = synth_items(nodes)
+            for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+                out = os.path.join(tmp, f"tracker_{backend}_{n}")
+                write_tracker(out, nodes)
+                if backend == "sqlite":
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        S.TrackerStore(out).close()  # migración fuera de la medida
+                def tracker(o=out, b=backend, its=items):
+                    res = S.update_tracker(o, [dict(i) for i in its], today, backend=b,
+                                           formats=("csv",), daily_csv=False)
+                    return res["items_collected"]
+                bench.stage(f"tracker/{backend}-{n}", tracker, "items")
+            del nodes, items
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {"date": today, "args": vars(args), "stages": bench.results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+        print(f"Informe: {args.out}")
+    if args.baseline:
+        slow = compare(bench.results, args.baseline, args.tolerance)
+        for name, before, now in slow:
+            print(f"REGRESIÓN {name}: {before:.3f}s -> {now:.3f}s (+{(now/before-1)*100:.0f} %)")
+        sys.exit(1 if slow else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Sitio local que imita AutoScout24 a partir de los HTML grabados en fixtures/:
+  /profesionales/<slug>?page=N     -> listado N del concesionario (ids únicos por concesionario
+                                      y página, paginación 1..P); "caido-…" responde 503
+  /anuncios/<slug>                 -> ficha
+  /img/<nombre>.jpg                -> JPEG pequeño
+Sirve tanto al camino HTTP (requests) como a Playwright apuntando start_url aquí.
+
+    python benchmarks/fixture_site.py --pages 5 --port 8765
+"""
+import os, re, io, time, zlib, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+LISTING_PATH = "/profesionales/love-cars"
+
+RE_ID = re.compile(r"-(\d{8})\b")
+RE_PAGER = re.compile(r'<nav class="pagination">.*?</nav>', re.S)
+REMOTE_IMG = "https://prod.pictures.autoscout24.net/listing-images/"
+
+def _read(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def _jpeg():
+    """JPEG de 320x240 (Pillow si está; si no, bytes JPEG mínimos válidos para el fetcher)."""
+    try:
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new("RGB", (320, 240), (180, 40, 40)).save(buf, "JPEG", quality=80)
+        return buf.getvalue()
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + b"\x00" * 400 + b"\xff\xd9"
+
+class FixtureSite:
+    """Servidor en 127.0.0.1 (puerto libre por defecto) en un hilo de fondo."""
+
+    def __init__(self, pages=3, port=0, latency=0.0):
+        self.pages, self.latency = pages, latency
+        self.listing_tpl, self.detail = _read("listing_page.html"), _read("detail_page.html")
+        self.ids = list(dict.fromkeys(RE_ID.findall(self.listing_tpl)))
+        self.image = _jpeg()
+        self.hits = {"listing": 0, "detail": 0, "image": 0, "other": 0}
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *a): pass
+            def do_GET(self):
+                site._serve(self)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.start_url = self.base + LISTING_PATH
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start(); return self
+    def __exit__(self, *exc):
+        self.httpd.shutdown(); self.httpd.server_close()
+
+    def dealer_url(self, slug):
+        return f"{self.base}/profesionales/{slug}"
+
+    def listing(self, n, path=LISTING_PATH):
+        """HTML del listado N: los ids del fixture se renumeran para que no se repitan entre páginas ni concesionarios."""
+        d = 0 if path == LISTING_PATH else zlib.crc32(path.encode()) % 900 + 100
+        ids = {old: f"{d:03d}{n:03d}{i:05d}" for i, old in enumerate(self.ids)}
+        html = RE_ID.sub(lambda m: "-" + ids[m.group(1)], self.listing_tpl)
+        pager = "".join(f'<a href="{path}?page={i}"{" aria-current=page" if i == n else ""}>{i}</a>'
+                        for i in range(1, self.pages + 1))
+        if n < self.pages:
+            pager += f'<a rel="next" href="{path}?page={n+1}">Siguiente</a>'
+        html = RE_PAGER.sub(f'<nav class="pagination">{pager}</nav>', html)
+        return html.replace(REMOTE_IMG, self.base + "/img/")
+
+    def _serve(self, h):
+        if self.latency:
+            time.sleep(self.latency)
+        u = urlparse(h.path)
+        if u.path.startswith("/profesionales/"):
+            n = int(dict(parse_qsl(u.query)).get("page", "1") or 1)
+            kind, body, ctype = "listing", None, "text/html; charset=utf-8"
+            if u.path.rstrip("/").rsplit("/", 1)[-1].startswith("caido"):
+                self.hits[kind] += 1
+                h.send_response(503); h.send_header("Content-Length", "0"); h.end_headers()
+                return
+            if 1 <= n <= self.pages:
+                body = self.listing(n, u.path).encode("utf-8")
+        elif u.path.startswith("/anuncios/"):
+            kind, body, ctype = "detail", self.detail.encode("utf-8"), "text/html; charset=utf-8"
+        elif u.path.startswith("/img/"):
+            kind, body, ctype = "image", self.image, "image/jpeg"
+        else:
+            kind, body, ctype = "other", None, "text/html"
+        self.hits[kind] += 1
+        if body is None:
+            h.send_response(404); h.send_header("Content-Length", "0"); h.end_headers()
+            return
+        h.send_response(200)
+        h.send_header("Content-Type", ctype)
+        h.send_header("Content-Length", str(len(body)))
+        h.end_headers()
+        h.wfile.write(body)
+
+def main():
+    ap = argparse.ArgumentParser(description="Sitio local con los fixtures del listado y las fichas")
+    ap.add_argument("--pages", type=int, default=3)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="segundos de espera por respuesta")
+    args = ap.parse_args()
+    with FixtureSite(args.pages, args.port, args.latency) as site:
+        print(f"start_url: {site.start_url}  (Ctrl+C para salir)")
+        try:
+            site.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Parsers de referencia basados en BeautifulSoup (implementación anterior a la de lxml).
+Solo los usan los benchmarks para medir la mejora y comprobar que la salida no cambia.
+"""
+import re
+from bs4 import BeautifulSoup
+from autoscout_scraper import clean, to_int, to_price, make_row
+
+def legacy_parse_card(card, base):
+    # enlace + id
+    a = (card.select_one("a[data-item-name='detail-page-link']") or
+         card.select_one("a[data-testid='result-list-entry-link']") or
+         card.select_one("a[href*='/anuncios/']") or
+         card.select_one("a[href*='/ofertas/']"))
+    if not a:
+        return None
+    link = a.get("href", "")
+    if link and not link.startswith("http"):
+        link = base + link
+
+    # título y texto bruto
+    title = clean(a.get_text(" ", strip=True))
+    if not title:
+        h = card.select_one("h2, h3")
+        if h:
+            title = clean(h.get_text(" ", strip=True))
+    raw = clean(card.get_text(" ", strip=True))
+
+    # ---- PRECIO ----
+    price = None
+    for sel in ('[data-testid="price-label"]',
+                '[data-testid="srp-price"]',
+                '[itemprop="price"]',
+                '[class*="Price"]',
+                '[class*="price"]'):
+        el = card.select_one(sel)
+        if el:
+            txt = el.get("content") or el.get_text(" ", strip=True)
+            price = to_price(txt)
+            if price is not None:
+                break
+    if price is None:
+        m = re.search(r'€\s*([\d\.\s,]+)', raw)
+        if m:
+            price = to_price(m.group(1))
+
+    # ---- KILÓMETROS ----
+    km = None
+    for sel in ('[data-testid="mileage"]', '[class*="mileage"]', '[class*="Mileage"]'):
+        el = card.select_one(sel)
+        if el:
+            km = to_int(el.get_text(" ", strip=True))
+            if km is not None:
+                break
+    if km is None:
+        m = re.search(r'(\d{1,3}(?:[.\s]\d{3})+|\d+)\s*km', raw, re.I)
+        if m:
+            km = to_int(m.group(1))
+
+    # ---- AÑO ----
+    year = None
+    for sel in ('[data-testid="first-registration"]',
+                '[class*="first-registration"]',
+                '[class*="FirstRegistration"]'):
+        el = card.select_one(sel)
+        if el:
+            m = re.search(r'(\d{4})', el.get_text(" ", strip=True))
+            if m:
+                year = int(m.group(1))
+                break
+    if year is None:
+        m = re.search(r'(20\d{2}|201\d)', raw)
+        if m:
+            year = int(m.group(1))
+
+    # ---- FUEL / CAMBIO ----
+    low = raw.lower()
+    if "diesel" in low:
+        fuel = "Diesel"
+    elif any(k in low for k in ["gasolina", "híbrido", "hibrido", "eléctrico", "electrico"]):
+        fuel = "Gasolina/Híbrido/Eléctrico"
+    else:
+        fuel = ""
+    gearbox = "Automático" if "auto" in low else ("Manual" if "manual" in low else "")
+
+    # ---- IMAGEN ----
+    img = ""
+    img_el = card.select_one("img")
+    if img_el:
+        img = (img_el.get("src")
+               or img_el.get("data-src")
+               or (img_el.get("data-srcset", "").split(" ")[0] if img_el.get("data-srcset") else ""))
+
+    return make_row(link, title, price, km, year, fuel, gearbox, img)
+
+def legacy_parse_detail_html(html):
+    """Extrae precio/km/año/combustible/cambio/potencia/imagen/IVA/descr de la ficha."""
+    soup = BeautifulSoup(html, "lxml")
+    text = soup.get_text(" ", strip=True)
+    out = {}
+
+    # -------- JSON-LD (si existe) --------
+    try:
+        import json
+        for s in soup.select('script[type="application/ld+json"]'):
+            try:
+                data = json.loads(s.string or "{}")
+                if isinstance(data, dict):
+                    offers = data.get("offers") or {}
+                    price = offers.get("price")
+                    if price is not None:
+                        out["price"] = to_price(str(price))
+                    # km en algunos ld+json no viene; lo seguiremos buscando
+            except Exception:
+                pass
+    except Exception:
+        pass
+
+    # -------- PRECIO (fallback en DOM/regex) --------
+    if out.get("price") is None:
+        for sel in ('[data-testid="price-label"]',
+                    '[data-testid="ad-price"]',
+                    '[itemprop="price"]',
+                    '[class*="Price"]','[class*="price"]'):
+            el = soup.select_one(sel)
+            if el:
+                out["price"] = to_price(el.get("content") or el.get_text(" ", strip=True))
+                if out["price"] is not None: break
+        if out.get("price") is None:
+            m = re.search(r'€\s*([\d\.\s,]+)', text)
+            if m: out["price"] = to_price(m.group(1))
+
+    # -------- KILÓMETROS --------
+    for sel in ('[data-testid="mileage"]','[class*="mileage"]','[class*="Mileage"]'):
+        el = soup.select_one(sel)
+        if el:
+            out["km"] = to_int(el.get_text(" ", strip=True))
+            if out["km"] is not None: break
+    if out.get("km") is None:
+        m = re.search(r'(\d{1,3}(?:[.\s]\d{3})+|\d+)\s*km', text, re.I)
+        if m: out["km"] = to_int(m.group(1))
+
+    # -------- AÑO (primera matriculación) --------
+    for sel in ('[data-testid="first-registration"]',
+                '[class*="first-registration"]','[class*="FirstRegistration"]'):
+        el = soup.select_one(sel)
+        if el:
+            m = re.search(r'(\d{4})', el.get_text(" ", strip=True))
+            if m: out["year"] = int(m.group(1)); break
+    if out.get("year") is None:
+        m = re.search(r'(\d{2}/)?(20\d{2}|201\d)', text)
+        if m:
+            yy = re.search(r'(20\d{2}|201\d)', m.group(0)).group(1)
+            out["year"] = int(yy)
+
+    # -------- COMBUSTIBLE / CAMBIO / POTENCIA --------
+    low = text.lower()
+    if "diésel" in low or "diesel" in low: out["fuel"] = "Diésel"
+    elif "gasolina" in low: out["fuel"] = "Gasolina"
+    elif "híbrido" in low or "hibrido" in low: out["fuel"] = "Híbrido"
+    elif "eléctrico" in low or "electrico" in low: out["fuel"] = "Eléctrico"
+
+    out["gearbox"] = "Automático" if "automát" in low or "automatic" in low else ("Manual" if "manual" in low else out.get("gearbox",""))
+
+    m = re.search(r'(\d+)\s*kW.*?\((\d+)\s*CV\)', text)
+    if m:
+        out["power_kw"] = int(m.group(1))
+        out["power_cv"] = int(m.group(2))
+
+    # -------- IVA / notas --------
+    if "iva no incluido" in low: out["vat_note"] = "IVA no incluido"
+    elif "iva incluido" in low: out["vat_note"] = "IVA incluido"
+    elif "iva deducible" in low: out["vat_note"] = "IVA deducible"
+
+    # -------- Imagen y descripción --------
+    og = soup.select_one('meta[property="og:image"]')
+    if og and og.get("content"): out["image"] = og["content"]
+    desc = soup.select_one('[data-testid="description"], section[id*="descripcion"], [class*="Description"]')
+    if desc:
+        out["desc_excerpt"] = clean(desc.get_text(" ", strip=True))[:800]
+    else:
+        out["desc_excerpt"] = clean(text)[:800]
+
+    return out
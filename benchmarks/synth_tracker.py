@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de trackers sintéticos (1k–100k anuncios con historial de precios largo)
+y de los items "de hoy" que se le aplican, para medir update_tracker sin red.
+"""
+import os, json, random
+from datetime import date, timedelta
+
+BRANDS = [("SEAT","Ibiza"),("Renault","Trafic"),("BMW","Serie 3"),("Toyota","C-HR"),("Citroën","Berlingo"),
+          ("Volkswagen","Golf"),("Peugeot","308"),("Mercedes-Benz","Vito"),("Ford","Transit"),("Kia","Sportage")]
+
+def synth_nodes(n, history=60, today=None, seed=1):
+    """{listing_id: nodo} con el formato de tracker_master.json; ~80 % activos."""
+    rnd = random.Random(seed)
+    today = date.fromisoformat(today) if today else date.today()
+    out = {}
+    for i in range(n):
+        lid = str(10_000_000 + i)
+        b, m = BRANDS[i % len(BRANDS)]
+        d0 = today - timedelta(days=rnd.randint(history, history * 3))
+        price = float(rnd.randint(6, 60) * 500)
+        hist = []
+        for k in range(history):
+            if k == 0 or rnd.random() < 0.5:
+                price = max(1000.0, price + rnd.choice((-500, -250, 250, 500)))
+                hist.append({"date": (d0 + timedelta(days=k)).isoformat(), "price": price})
+        active = rnd.random() < 0.8
+        removed = "" if active else (today - timedelta(days=rnd.randint(1, 30))).isoformat()
+        out[lid] = {
+            "listing_id": lid, "first_seen": d0.isoformat(),
+            "last_seen": (today - timedelta(days=1)).isoformat() if active else removed,
+            "removed_on": removed, "days_active": 0, "status": "active" if active else "removed",
+            "brand": b, "model": m, "version": f"{b} {m} v{i % 7}", "year": 2012 + i % 12,
+            "km": rnd.randint(5, 200) * 1000, "fuel": rnd.choice(["Diésel","Gasolina","Híbrido"]),
+            "gearbox": rnd.choice(["Manual","Automático"]), "vat_note": "", "category": "Turismo",
+            "link": f"https://www.autoscout24.es/anuncios/{b.lower()}-{lid}", "image_file": "",
+            "desc_excerpt": "", "last_price": price, "price_first_seen": hist[0]["date"],
+            "price_last_change": hist[-1]["date"], "price_changes_count": len(hist) - 1,
+            "price_history": hist,
+            "card_sig": {"price": price, "km": None, "title": f"{b} {m} v{i % 7}"},
+            "last_enriched": (today - timedelta(days=rnd.randint(1, 10))).isoformat(),
+        }
+    return out
+
+def write_tracker(outdir, nodes):
+    """Escribe tracker_master.json (TrackerStore lo migra a SQLite al abrirlo)."""
+    os.makedirs(outdir, exist_ok=True)
+    path = os.path.join(outdir, "tracker_master.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(nodes, f, ensure_ascii=False)
+    return path
+
+def synth_items(nodes, churn=0.03, price_change=0.05, seed=2):
+    """Items de un día: los activos menos `churn` bajas, `price_change` con precio nuevo y altas nuevas."""
+    rnd = random.Random(seed)
+    items = []
+    for lid, v in nodes.items():
+        if v["status"] != "active" or rnd.random() < churn:
+            continue
+        price = v["last_price"] + (rnd.choice((-750, -500, 500)) if rnd.random() < price_change else 0)
+        items.append({"listing_id": lid, "brand": v["brand"], "model": v["model"], "version": v["version"],
+                      "year": v["year"], "km": v["km"], "fuel": v["fuel"], "gearbox": v["gearbox"],
+                      "price": price, "vat_note": "", "link": v["link"], "image": "", "category": v["category"]})
+    base = 10_000_000 + len(nodes)
+    for i in range(int(len(items) * churn) + 1):
+        b, m = BRANDS[i % len(BRANDS)]
+        items.append({"listing_id": str(base + i), "brand": b, "model": m, "version": f"{b} {m}",
+                      "year": 2020, "km": 10000, "fuel": "Gasolina", "gearbox": "Manual",
+                      "price": 19990.0, "vat_note": "", "link": f"https://www.autoscout24.es/anuncios/x-{base+i}",
+                      "image": "", "category": "Turismo"})
+    return items
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
-import os, sys, json, subprocess
+import os, json, gzip, queue, base64, hashlib, threading
 from datetime import datetime, date
-import pandas as pd
+import numpy as np, pandas as pd
 from functools import wraps
 from flask import Flask, render_template, jsonify, send_from_directory, request, Response
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -11,7 +11,7 @@ HERE = os.path.abspath(os.path.dirname(__file__))
 OUT  = os.path.join(HERE, "output")
 
 app = Flask(__name__, template_folder=os.path.join(HERE, "templates"))
-status = {"running": False, "message": "listo", "last_run": None}
+status = {"running": False, "message": "listo", "last_run": None, "stage": "", "progress": {}}
 
 # --------------------------- Config ---------------------------
 
@@ -23,6 +23,11 @@ def read_cfg():
     except:
         return {"daily_run": "08:15", "timezone": "Europe/Madrid"}
 
+# Ancho de miniatura que piden las tarjetas (/media/…?w=N); las genera el scraper al descargar
+THUMB_W = int(((read_cfg() or {}).get("thumb_widths") or [320])[0])
+MEDIA_MAX_AGE = 365*24*3600
+MEDIA_FALLBACK_MAX_AGE = 300   # ?w=N aún sin variante: original con caché corta, hasta que exista
+
 # --------- AUTH BÁSICA (usuario/contraseña) opcional ----------
 
 def _auth_enabled():
@@ -68,72 +73,317 @@ def requires_auth(fn):
 
 # ----------------------- Carga de datos -----------------------
 
+PE_COLS = ["date","listing_id","title","old_price","new_price","delta","pct"]
+
+class Frame:
+    """DataFrame parseado + índices precalculados valor -> posiciones de fila."""
+    INDEXED = ("first_seen", "removed_on", "status")
+
+    def __init__(self, df):
+        self.df = df
+        self.memo = {}
+        self.stamp = None   # (fichero, firma) de origen, para ETags
+        self.idx = {c: (df.groupby(c, sort=False).indices if c in df.columns else {}) for c in self.INDEXED}
+
+    def rows(self, col, value):
+        pos = self.idx.get(col, {}).get(value)
+        return self.df.iloc[pos] if pos is not None else self.df.iloc[0:0]
+
+    def values(self, col):
+        return [v for v in self.idx.get(col, {}) if v]
+
+    def num(self, col):
+        """Columna numérica (convertida una vez por versión del fichero)."""
+        key = ("num", col)
+        if key not in self.memo:
+            self.memo[key] = pd.to_numeric(self.df[col], errors="coerce") if col in self.df.columns \
+                else pd.Series(np.nan, index=self.df.index)
+        return self.memo[key]
+
+EMPTY = Frame(pd.DataFrame())
+
+class DataCache:
+    """Cache en memoria de los ficheros que leen las rutas; se invalida sola si cambia mtime/tamaño."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    @staticmethod
+    def _sig(path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except (FileNotFoundError, TypeError):
+            return None
+
+    def get(self, key, path, loader, sig=None):
+        sig = sig if sig is not None else (path, self._sig(path))
+        with self.lock:
+            e = self.entries.get(key)
+            if e and e[0] == sig:
+                return e[1]
+        val = loader(path if self._sig(path) else None)
+        with self.lock:
+            self.entries[key] = (sig, val)
+        return val
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+cache = DataCache()
+
+def _read_csv_frame(path):
+    if not path:
+        return EMPTY
+    try:
+        fr = Frame(pd.read_csv(path, dtype=str).fillna(""))
+    except Exception:
+        return EMPTY
+    fr.stamp = (path, DataCache._sig(path))
+    return fr
+
+def _read_parquet_frame(path):
+    """tracker_master.parquet con el mismo aspecto que el CSV (texto, fechas ISO, vacíos como "")."""
+    if not path:
+        return EMPTY
+    try:
+        df = pd.read_parquet(path)
+        for c in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[c]):
+                df[c] = df[c].dt.strftime("%Y-%m-%d")
+        fr = Frame(df.astype(object).where(df.notna(), "").astype(str))
+    except Exception:
+        return EMPTY
+    fr.stamp = (path, DataCache._sig(path))
+    return fr
+
+def _read_events(path):
+    try:
+        return pd.read_csv(path, dtype=str).fillna("") if path else pd.DataFrame(columns=PE_COLS)
+    except Exception:
+        return pd.DataFrame(columns=PE_COLS)
+
 def latest_consolidated():
-    if not os.path.isdir(OUT):
-        return None
-    xs = sorted([f for f in os.listdir(OUT)
-                 if f.startswith("lovecars_autoscout_consolidado_") and f.endswith(".csv")])
-    return os.path.join(OUT, xs[-1]) if xs else None
+    def scan(_):
+        if not os.path.isdir(OUT):
+            return None
+        xs = sorted([f for f in os.listdir(OUT)
+                     if f.startswith("lovecars_autoscout_consolidado_") and f.endswith(".csv")])
+        return os.path.join(OUT, xs[-1]) if xs else None
+    return cache.get("latest_consolidated", OUT, scan)
+
+def _master_path():
+    # El parquet (tipado, más rápido de leer) si está al día con el CSV; con output_formats sin "parquet" deja de escribirse
+    csv, pq = os.path.join(OUT, "lovecars_tracker_master.csv"), os.path.join(OUT, "tracker_master.parquet")
+    s_csv, s_pq = DataCache._sig(csv), DataCache._sig(pq)
+    return pq if s_pq and (not s_csv or s_pq[0] >= s_csv[0]) else csv
+
+def master_frame():
+    path = _master_path()
+    if path.endswith(".parquet"):
+        return cache.get("master_parquet", path, _read_parquet_frame)
+    return cache.get("master", path, _read_csv_frame)
+
+def snapshot_frame():
+    # La copia diaria solo si es al menos del día del master: con daily_csv: false dejan de escribirse
+    # y la última que quede se queda atrás; entonces el master ya es la foto del día
+    m = latest_consolidated()
+    sig = DataCache._sig(_master_path())
+    master_day = date.fromtimestamp(sig[0] / 1e9).isoformat() if sig else ""
+    if m and os.path.basename(m)[len("lovecars_autoscout_consolidado_"):-len(".csv")] >= master_day:
+        return cache.get("snapshot", m, _read_csv_frame)
+    return master_frame()
 
 def load_frames():
-    m = latest_consolidated()
-    if not m:
+    fr = snapshot_frame()
+    if fr.df.empty:
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-    df = pd.read_csv(m, dtype=str).fillna("")
     today = date.today().isoformat()
-    inv   = df[df.get("status","")== "active"].copy() if "status" in df.columns else df.copy()
-    altas = df[df.get("first_seen","")==today].copy()
-    bajas = df[df.get("removed_on","")==today].copy()
-    pev   = os.path.join(OUT, f"lovecars_price_events_{today}.csv")
-    try:
-        pe = pd.read_csv(pev, dtype=str).fillna("") if os.path.exists(pev) else \
-             pd.DataFrame(columns=["date","listing_id","title","old_price","new_price","delta","pct"])
-    except:
-        pe = pd.DataFrame(columns=["date","listing_id","title","old_price","new_price","delta","pct"])
+    inv   = fr.rows("status", "active") if "status" in fr.df.columns else fr.df
+    altas = fr.rows("first_seen", today)
+    bajas = fr.rows("removed_on", today)
+    pe = cache.get("price_events", os.path.join(OUT, f"lovecars_price_events_{today}.csv"), _read_events)
     return inv, altas, bajas, pe
 
-# --------------------- Subproceso scraper ---------------------
+# ------------------ Scraper en proceso (cola + eventos) ------------------
+
+class EventBus:
+    """Reparte los eventos del scraper a los clientes de /events (una cola acotada por cliente)."""
+    def __init__(self, maxsize=100):
+        self.lock = threading.Lock()
+        self.subs, self.maxsize = set(), maxsize
+
+    def subscribe(self):
+        q = queue.Queue(self.maxsize)
+        with self.lock:
+            self.subs.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subs.discard(q)
+
+    def publish(self, ev):
+        with self.lock:
+            subs = list(self.subs)
+        for q in subs:
+            try:
+                q.put_nowait(ev)
+            except queue.Full:
+                pass   # cliente lento: pierde este evento, el siguiente "progress" lo pone al día
+
+bus = EventBus()
+
+class JobRunner:
+    """Ejecuta el scraper de uno en uno en un hilo de fondo de este proceso; el progreso se publica en `bus`."""
+    def __init__(self, config_path):
+        self.config_path = config_path
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.busy = False   # hay una ejecución encolada o en marcha
+        self.thread = None
+
+    def submit(self, source="manual"):
+        """Encola una ejecución; False si ya hay una pendiente o en curso."""
+        with self.lock:
+            if self.busy:
+                return False
+            self.busy = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="scraper", daemon=True)
+                self.thread.start()
+        self.jobs.put(source)
+        bus.publish({"event": "queued", "source": source})
+        return True
+
+    def _loop(self):
+        while True:
+            source = self.jobs.get()
+            try:
+                self._run(source)
+            finally:
+                with self.lock:
+                    self.busy = False
+
+    def _on_event(self, ev):
+        if ev["event"] == "stage":
+            status["stage"] = ev["stage"]
+        elif ev["event"] == "progress":
+            status["progress"] = {**ev["counters"], **ev.get("gauges", {})}
+        bus.publish(ev)
+
+    def _run(self, source):
+        status.update(running=True, message="Actualizando…", stage="", progress={})
+        bus.publish({"event": "started", "source": source})
+        try:
+            import autoscout_scraper
+            res = autoscout_scraper.run_once(self.config_path, on_event=self._on_event)
+            ok, msg = True, f"OK: {res.get('items_collected', 0)} fichas"
+        except Exception as e:
+            ok, msg = False, f"ERROR: {e!r}"[:300]
+        cache.invalidate()
+        status.update(running=False, message=msg, last_run=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        bus.publish({"event": "done", "ok": ok, "message": msg, "source": source})
 
-def run_scraper_subproc():
-    cmd = [sys.executable, "-c",
-           "import json,autoscout_scraper; print(json.dumps(autoscout_scraper.run_once('config.yaml')))" ]
-    p = subprocess.run(cmd, capture_output=True, text=True)
-    if p.returncode != 0:
-        return False, f"rc={p.returncode} stderr={p.stderr[:300]} | stdout={p.stdout[:300]}"
-    try:
-        return True, json.loads(p.stdout.strip())
-    except Exception as e:
-        return False, f"Salida no JSON: {e}"
+jobs = JobRunner(os.path.join(HERE, "config.yaml"))
 
 # ----------------------- Rutas principales --------------------
 
 @app.get("/")
 @requires_auth
 def index():
+    # El inventario completo lo pide la página por /api/inventory a medida que se hace scroll
     inv, altas, bajas, pe = load_frames()
     return render_template(
         "index.html",
-        inv=inv.to_dict(orient="records"),
+        n_inv=len(inv),
         altas=altas.to_dict(orient="records"),
         bajas=bajas.to_dict(orient="records"),
         pe=pe.to_dict(orient="records"),
         last_run=status.get("last_run"),
+        thumb_w=THUMB_W,
     )
 
+# ----------------------- API de inventario -----------------------
+
+INV_FILTERS = {"brand": "brand", "category": "category", "fuel": "fuel", "gearbox": "gearbox", "dealer": "dealer"}
+INV_RANGES = {"price": "last_price", "year": "year", "km": "km"}
+INV_SORTS = {"price": "last_price", "year": "year", "km": "km", "first_seen": "first_seen",
+             "brand": "brand", "days_active": "days_active"}
+INV_NUMERIC = {"last_price", "year", "km", "days_active"}
+INV_MAX_LIMIT = 500
+
+def _encode_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode().rstrip("=")
+
+def _decode_cursor(c):
+    """Offset del cursor (0 sin cursor); None si no es válido o es negativo."""
+    if not c:
+        return 0
+    try:
+        o = int(json.loads(base64.urlsafe_b64decode(c + "=" * (-len(c) % 4)))["o"])
+    except Exception:
+        return None
+    return o if o >= 0 else None
+
+def _inventory_query(fr, args):
+    df = fr.rows("status", "active") if "status" in fr.df.columns else fr.df
+    mask = pd.Series(True, index=df.index)
+    for arg, col in INV_FILTERS.items():
+        vals = [v.strip().lower() for v in args.get(arg, "").split(",") if v.strip()]
+        if vals and col in df.columns:
+            mask &= df[col].str.lower().isin(vals)
+    for arg, col in INV_RANGES.items():
+        num = fr.num(col).loc[df.index]
+        lo, hi = args.get(f"{arg}_min", type=float), args.get(f"{arg}_max", type=float)
+        if lo is not None: mask &= num >= lo
+        if hi is not None: mask &= num <= hi
+    df = df[mask]
+    sort = args.get("sort", "")
+    key = INV_SORTS.get(sort.lstrip("-"))
+    if key and key in df.columns:
+        by = fr.num(key).loc[df.index] if key in INV_NUMERIC else df[key]
+        order = by.sort_values(ascending=not sort.startswith("-"), kind="mergesort", na_position="last").index
+        df = df.loc[order]
+    return df
+
+@app.get("/api/inventory")
+@requires_auth
+def api_inventory():
+    """Inventario activo filtrado/ordenado en servidor (?brand=…&sort=-price&fields=…), paginado por cursor, con ETag y gzip."""
+    fr = snapshot_frame()
+    etag = hashlib.sha1(f"{fr.stamp}|{request.query_string.decode()}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    df = _inventory_query(fr, request.args)
+    limit = max(1, min(request.args.get("limit", 50, type=int) or 50, INV_MAX_LIMIT))
+    offset = _decode_cursor(request.args.get("cursor", ""))
+    if offset is None:
+        return jsonify({"ok": False, "message": "cursor no válido"}), 400
+    page = df.iloc[offset:offset + limit]
+    fields = [f for f in request.args.get("fields", "").split(",") if f in page.columns]
+    if fields:
+        page = page[fields]
+    nxt = offset + limit
+    body = json.dumps({
+        "total": len(df),
+        "items": page.to_dict(orient="records"),
+        "next_cursor": _encode_cursor(nxt) if nxt < len(df) else None,
+    }, ensure_ascii=False).encode("utf-8")
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("Accept-Encoding", "") and len(body) > 1024:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype="application/json", headers=headers)
+
 @app.post("/update")
 @requires_auth
 def update():
-    if status["running"]:
+    if not jobs.submit("manual"):
         return jsonify({"ok": False, "message": "Proceso en curso"}), 409
-    import threading
-    def work():
-        status["running"] = True
-        status["message"] = "Actualizando…"
-        ok, payload = run_scraper_subproc()
-        status["running"] = False
-        status["last_run"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        status["message"] = ("OK: "+str(payload.get("items_collected",0))+" fichas") if ok else ("ERROR: "+str(payload))
-    threading.Thread(target=work, daemon=True).start()
     return jsonify({"ok": True})
 
 @app.get("/status")
@@ -141,23 +391,108 @@ def update():
 def st():
     return jsonify(status)
 
+SSE_PING = 15   # seg. entre comentarios de keep-alive (proxies que cortan conexiones mudas)
+
+def _sse(ev):
+    return f"event: {ev['event']}\ndata: {json.dumps(ev, ensure_ascii=False, default=str)}\n\n"
+
+@app.get("/events")
+@requires_auth
+def events():
+    """Server-Sent Events: el estado actual al conectar y después cada evento del scraper."""
+    q = bus.subscribe()
+    def stream():
+        try:
+            yield _sse({"event": "status", **status})
+            while True:
+                try:
+                    yield _sse(q.get(timeout=SSE_PING))
+                except queue.Empty:
+                    yield ": ping\n\n"
+        finally:
+            bus.unsubscribe(q)
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ------------------ Métricas (formato Prometheus) ------------------
+
+def _read_report(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f: return json.load(f)
+    except Exception:
+        return {}
+
+def _prom_escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom(lines, name, help_, samples):
+    """samples: [(labels dict, valor)] -> líneas HELP/TYPE + una por muestra (gauge)."""
+    lines += [f"# HELP {name} {help_}", f"# TYPE {name} gauge"]
+    for labels, v in samples:
+        lab = ",".join(f'{k}="{_prom_escape(x)}"' for k, x in labels.items())
+        lines.append(f"{name}{{{lab}}} {float(v or 0)}" if lab else f"{name} {float(v or 0)}")
+
+@app.get("/metrics")
+@requires_auth
+def metrics():
+    """Última ejecución del scraper (last_run_report.json que escribe RunMetrics) + estado actual."""
+    rep = cache.get("run_report", os.path.join(OUT, "last_run_report.json"), _read_report)
+    lines = []
+    _prom(lines, "lovecars_scraper_running", "1 si hay una actualización en curso", [({}, status["running"])])
+    if rep:
+        try:
+            finished = datetime.fromisoformat(rep["finished_at"]).timestamp()
+        except Exception:
+            finished = 0
+        _prom(lines, "lovecars_last_run_success", "1 si la última ejecución terminó bien", [({}, rep.get("ok"))])
+        _prom(lines, "lovecars_last_run_timestamp_seconds", "Fin de la última ejecución (epoch)", [({}, finished)])
+        _prom(lines, "lovecars_last_run_duration_seconds", "Duración total de la última ejecución",
+              [({}, rep.get("duration_s"))])
+        stages = rep.get("stages", {})
+        _prom(lines, "lovecars_last_run_stage_seconds", "Segundos acumulados por etapa",
+              [({"stage": k}, v.get("seconds")) for k, v in sorted(stages.items())])
+        _prom(lines, "lovecars_last_run_stage_calls", "Llamadas medidas por etapa",
+              [({"stage": k}, v.get("calls")) for k, v in sorted(stages.items())])
+        _prom(lines, "lovecars_last_run_count", "Contadores de la última ejecución (páginas, fichas, reintentos, fallos…)",
+              [({"counter": k}, v) for k, v in sorted(rep.get("counters", {}).items())])
+        _prom(lines, "lovecars_last_run_gauge", "Valores finales (ritmo adaptativo rate_rps, requests_per_minute logradas)",
+              [({"gauge": k}, v) for k, v in sorted(rep.get("gauges", {}).items())])
+        _prom(lines, "lovecars_inventory", "Activos/altas/bajas/cambios de precio de la última ejecución",
+              [({"kind": k}, v) for k, v in sorted(rep.get("counts", {}).items())])
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
 @app.get("/media/<path:p>")
 @requires_auth
 def media(p):
-    return send_from_directory(OUT, p)
+    # ?w=N sirve la variante derivada (WebP si el navegador la acepta); si no existe, el original
+    w = request.args.get("w", type=int)
+    served = not w
+    if w:
+        stem = os.path.splitext(os.path.basename(p))[0]
+        exts = (["webp"] if "image/webp" in request.headers.get("Accept", "") else []) + ["jpg"]
+        for ext in exts:
+            cand = f"media/thumbs/{stem}_w{w}.{ext}"
+            if os.path.exists(os.path.join(OUT, cand)):
+                p, served = cand, True
+                break
+    resp = send_from_directory(OUT, p, max_age=MEDIA_MAX_AGE if served else MEDIA_FALLBACK_MAX_AGE,
+                               etag=True, conditional=True)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = served
+    resp.vary.add("Accept")
+    return resp
 
 # --------------------- Helpers Diario (Altas/Bajas) ---------------------
 
 def _load_master():
-    mpath = os.path.join(OUT, "lovecars_tracker_master.csv")
-    if not os.path.exists(mpath):
-        return pd.DataFrame()
-    try:
-        return pd.read_csv(mpath, dtype=str).fillna("")
-    except Exception:
-        return pd.DataFrame()
+    return master_frame().df
 
 def _list_available_days():
+    sig = tuple(DataCache._sig(p) for p in (OUT, os.path.join(OUT, "snapshots"),
+                                            os.path.join(OUT, "lovecars_tracker_master.csv")))
+    return cache.get("days", None, lambda _: _scan_days(), sig=sig)
+
+def _scan_days():
     try:
         files = [f for f in os.listdir(OUT)
                  if f.startswith("lovecars_autoscout_consolidado_") and f.endswith(".csv")]
@@ -169,12 +504,14 @@ def _list_available_days():
             days.append(f.split("_")[-1].replace(".csv",""))
         except:
             pass
+    try:
+        days += [d[5:] for d in os.listdir(os.path.join(OUT, "snapshots")) if d.startswith("date=")]
+    except FileNotFoundError:
+        pass
     if not days:
-        m = _load_master()
-        if not m.empty:
-            for col in ("first_seen","removed_on"):
-                if col in m.columns:
-                    days += [d for d in m[col].dropna().unique().tolist() if d]
+        m = master_frame()
+        for col in ("first_seen","removed_on"):
+            days += m.values(col)
     days = sorted(set(days), reverse=True)
     return days or [date.today().isoformat()]
 
@@ -189,25 +526,33 @@ def _normalize_day(s: str) -> str:
             pass
     return s[:10]
 
-def _record_to_card(r):
-    d = r if isinstance(r, dict) else dict(r)
-    title = " ".join([d.get("brand",""), d.get("model",""), d.get("version","")]).strip()
-    imgf = d.get("image_file") or d.get("image") or ""
-    thumb = f"/media/{imgf}" if (imgf and not imgf.startswith("http")) else imgf
-    return {
-        "title": title,
-        "year": d.get("year",""),
-        "km": d.get("km",""),
-        "price": d.get("last_price","") or d.get("price",""),
-        "link": d.get("link",""),
-        "first_seen": d.get("first_seen",""),
-        "last_seen": d.get("last_seen",""),
-        "removed_on": d.get("removed_on",""),
-        "listing_id": d.get("listing_id",""),
-        "status": d.get("status",""),
-        "category": d.get("category",""),
-        "thumb": thumb
-    }
+CARD_COLS = ["year","km","link","first_seen","last_seen","removed_on","listing_id","status","category"]
+
+def _cards(df):
+    """Tarjetas del diario construidas por columnas (una pasada) en vez de fila a fila."""
+    if df.empty:
+        return []
+    col = lambda c: df[c] if c in df.columns else pd.Series("", index=df.index)
+    imgf = col("image_file").where(col("image_file") != "", col("image"))
+    local = (imgf != "") & ~imgf.str.startswith("http")
+    out = pd.DataFrame({
+        "title": (col("brand") + " " + col("model") + " " + col("version")).str.strip(),
+        **{c: col(c) for c in CARD_COLS},
+        "price": col("last_price").where(col("last_price") != "", col("price")),
+        "thumb": imgf.where(~local, "/media/" + imgf + f"?w={THUMB_W}"),
+    })
+    return out.to_dict(orient="records")
+
+def _rows_between(fr, col, d0, d1):
+    """Filas cuyo `col` cae en [d0, d1] usando el índice fecha -> posiciones."""
+    pos = [p for k, p in fr.idx.get(col, {}).items() if k and d0 <= k <= d1]
+    if not pos:
+        return fr.df.iloc[0:0]
+    return fr.df.iloc[sorted(np.concatenate(pos))]
+
+def _int_arg(name, default):
+    v = request.args.get(name, type=int)
+    return default if v is None or v < 0 else v
 
 @app.get("/days")
 @requires_auth
@@ -217,22 +562,23 @@ def days():
 @app.get("/bydate")
 @requires_auth
 def bydate():
+    """Altas/bajas de un día (?date=) o rango (?from=&to=), paginadas con ?limit=&offset= (counts son los totales)."""
     day = _normalize_day(request.args.get("date"))
-    df = _load_master()
-    if df.empty:
-        return jsonify({"date": day, "counts": {"altas":0,"bajas":0}, "altas": [], "bajas": []})
-    for col in ("first_seen","removed_on"):
-        if col not in df.columns:
-            df[col] = ""
-    altas = df[df["first_seen"] == day]
-    bajas = df[df["removed_on"] == day]
-    altas_cards = [_record_to_card(r) for _, r in altas.iterrows()]
-    bajas_cards = [_record_to_card(r) for _, r in bajas.iterrows()]
+    d0 = _normalize_day(request.args.get("from")) if request.args.get("from") else day
+    d1 = _normalize_day(request.args.get("to")) if request.args.get("to") else (d0 if request.args.get("from") else day)
+    limit, offset = _int_arg("limit", 0), _int_arg("offset", 0)
+    fr = master_frame()
+    if d0 == d1:
+        altas, bajas = fr.rows("first_seen", d0), fr.rows("removed_on", d0)
+    else:
+        altas, bajas = _rows_between(fr, "first_seen", d0, d1), _rows_between(fr, "removed_on", d0, d1)
+    page = slice(offset, offset + limit if limit else None)
     return jsonify({
-        "date": day,
-        "counts": {"altas": len(altas_cards), "bajas": len(bajas_cards)},
-        "altas": altas_cards,
-        "bajas": bajas_cards
+        "date": d0 if d0 == d1 else f"{d0}/{d1}",
+        "from": d0, "to": d1, "limit": limit, "offset": offset,
+        "counts": {"altas": len(altas), "bajas": len(bajas)},
+        "altas": _cards(altas.iloc[page]),
+        "bajas": _cards(bajas.iloc[page])
     })
 
 # --------------------- Planificación diaria ---------------------
@@ -242,12 +588,12 @@ def schedule_daily():
     hh, mm = (cfg.get("daily_run") or "08:15").split(":")
     tz = ZoneInfo(cfg.get("timezone", "Europe/Madrid"))
     sch = BackgroundScheduler(timezone=tz)
-    sch.add_job(lambda: run_scraper_subproc(), "cron", hour=int(hh), minute=int(mm), id="daily")
+    sch.add_job(lambda: jobs.submit("daily"), "cron", hour=int(hh), minute=int(mm), id="daily")
     sch.start()
 
 # --------------------------- Main -----------------------------
 
 if __name__ == "__main__":
     schedule_daily()
-    app.run(host="0.0.0.0", port=8000)
+    app.run(host="0.0.0.0", port=8000, threaded=True)   # un hilo por cliente de /events
 